@@ -0,0 +1,10 @@
+import os
+
+
+def data_dir(*parts):
+    """Return (and create) a directory under the tool's local data folder"""
+    root = os.environ.get("TRANSCRIBE_HOME",
+                          os.path.join(os.path.expanduser("~"), ".speech_transcription"))
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
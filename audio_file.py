@@ -0,0 +1,172 @@
+from fractions import Fraction
+
+import numpy as np
+import soundfile as sf
+from whisper.audio import HOP_LENGTH, N_FFT, N_FRAMES, SAMPLE_RATE
+
+from mel_features import LogMelFrames, normalize_log_mel, silence_frames
+
+
+class StreamingResampler:
+    """Band-limited (Kaiser-windowed sinc) sample rate conversion over consecutive blocks.
+
+    The filter state carries over between ``process`` calls, so resampling a
+    file block by block gives the same samples as resampling it in one go.
+    """
+
+    def __init__(self, in_rate, out_rate, zero_crossings=16, rolloff=0.95, beta=8.6):
+        ratio = Fraction(int(in_rate), int(out_rate))
+        self._up, self._down = ratio.denominator, ratio.numerator  # input step = down / up
+        self.passthrough = in_rate == out_rate
+        cutoff = min(1.0, out_rate / in_rate) * rolloff
+        self._half = int(np.ceil(zero_crossings / cutoff))
+
+        # One row of filter taps per fractional input position (polyphase table)
+        taps = np.arange(-self._half + 1, self._half + 1)
+        distance = taps[None, :] - (np.arange(self._up) / self._up)[:, None]
+        window = np.i0(beta * np.sqrt(np.clip(1 - (distance / self._half) ** 2, 0, None))) / np.i0(beta)
+        self._taps = taps
+        self._table = (cutoff * np.sinc(cutoff * distance) * window).astype(np.float32)
+
+        self._buffer = np.zeros(self._half, dtype=np.float32)  # silence before the start
+        self._base = -self._half  # input index of _buffer[0]
+        self._next = 0            # next output index
+        self._total_in = 0
+
+    def process(self, samples, final=False):
+        """Resample the next block of mono samples"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.passthrough:
+            return samples
+        self._buffer = np.concatenate((self._buffer, samples))
+        self._total_in += len(samples)
+
+        if final:
+            self._buffer = np.concatenate((self._buffer, np.zeros(self._half + 1, dtype=np.float32)))
+            last = -(-self._total_in * self._up // self._down)
+        else:
+            # Output t needs input up to floor(t * down / up) + half
+            available = self._base + len(self._buffer) - self._half
+            last = max(self._next, ((available - 1) * self._up) // self._down + 1) if available > 0 else self._next
+
+        output = []
+        for start in range(self._next, last, 4096):
+            t = np.arange(start, min(start + 4096, last), dtype=np.int64)
+            position = t * self._down
+            index = position // self._up - self._base
+            window = self._buffer[index[:, None] + self._taps[None, :]]
+            output.append(np.einsum("ij,ij->i", window, self._table[position % self._up]))
+        self._next = last
+
+        keep_from = (self._next * self._down) // self._up - self._half + 1 - self._base
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._base += keep_from
+        return np.concatenate(output) if output else np.zeros(0, dtype=np.float32)
+
+    def aligned_start(self, out_index):
+        """Where to start reading to resume the output at ``out_index``.
+
+        Returns (input index, output index): the output index is at or before
+        ``out_index``, far enough back for the filter to have real history by
+        ``out_index``, and on a sample that lines up with the input grid.
+        """
+        if self.passthrough:
+            return out_index, out_index
+        warmup = -(-self._half * self._up // self._down) + 1
+        out_start = max(0, (out_index - warmup) // self._up * self._up)
+        return out_start * self._down // self._up, out_start
+
+    def flush(self):
+        """Return the remaining output once the input has ended"""
+        return self.process(np.zeros(0, dtype=np.float32), final=True)
+
+
+class FileFeatures:
+    """Whisper log-mel windows of an audio file, read and computed on demand.
+
+    The file is read in ``block_seconds`` blocks through soundfile, down-mixed,
+    resampled to 16 kHz and turned into mel frames; frames before the decoder's
+    current position are released.  Memory use therefore depends on the window
+    and block size, not on the length of the file.
+
+    Whisper normalizes a clip by its loudest frame; here that is the loudest
+    frame read so far, which includes the whole window being decoded.
+
+    ``start_frame`` and ``max_value`` resume a file from a checkpoint: only
+    the audio from shortly before that frame is read.
+    """
+
+    def __init__(self, path, n_mels=80, block_seconds=10.0, start_frame=0, max_value=-np.inf):
+        self._file = sf.SoundFile(path)
+        self.duration = self._file.frames / self._file.samplerate
+        self._block_frames = max(1, int(block_seconds * self._file.samplerate))
+        self._resampler = StreamingResampler(self._file.samplerate, SAMPLE_RATE)
+        self._mel = LogMelFrames(n_mels)
+        self._raw = np.zeros((n_mels, 0), dtype=np.float32)
+        self._offset = 0  # frame index of _raw[:, 0]
+        self._eof = False
+        self._skip = 0    # resampled samples to discard before framing
+        self.peak_bytes = 0  # most mel frame memory held at once
+
+        first_sample = start_frame * HOP_LENGTH - N_FFT // 2
+        if first_sample > 0:
+            in_index, out_index = self._resampler.aligned_start(first_sample)
+            self._file.seek(in_index)
+            self._skip = first_sample - out_index
+            self._mel.seek(start_frame, max_value)
+            self._offset = start_frame
+
+    @property
+    def max_value(self):
+        """Loudest raw log-mel value so far, needed to resume normalization"""
+        return self._mel.max_value
+
+    def close(self):
+        self._file.close()
+
+    def window(self, seek):
+        """Return (normalized mel padded to N_FRAMES, number of content frames in it)"""
+        self._release(seek)
+        while not self._eof and self._offset + self._raw.shape[1] < seek + N_FRAMES:
+            self._read_block()
+            self._release(seek)
+
+        end = seek + N_FRAMES
+        if self._eof:
+            end = min(end, self._mel.content_frames)
+        if end <= seek:
+            return None, 0
+
+        raw = self._raw[:, seek - self._offset:seek - self._offset + N_FRAMES]
+        mel = normalize_log_mel(raw, self._mel.max_value)
+        if mel.shape[1] < N_FRAMES:
+            padding = silence_frames(mel.shape[0], N_FRAMES - mel.shape[1], self._mel.max_value)
+            mel = np.concatenate((mel, padding), axis=1)
+        return mel, end - seek
+
+    def _release(self, seek):
+        """Drop the frames before ``seek``; the decoder never goes back"""
+        drop = min(seek - self._offset, self._raw.shape[1])
+        if drop > 0:
+            self._raw = self._raw[:, drop:]
+            self._offset += drop
+
+    def _discard_warmup(self, samples):
+        """Drop the resampled samples read only to prime the filter on resume"""
+        if self._skip:
+            dropped = min(self._skip, len(samples))
+            samples = samples[dropped:]
+            self._skip -= dropped
+        return samples
+
+    def _read_block(self):
+        """Read, down-mix, resample and frame the next block of the file"""
+        data = self._file.read(self._block_frames, dtype="float32", always_2d=True)
+        if len(data):
+            blocks = [self._mel.append(self._discard_warmup(self._resampler.process(data.mean(axis=1))))]
+        else:
+            blocks = [self._mel.append(self._discard_warmup(self._resampler.flush())), self._mel.flush()]
+            self._eof = True
+        self._raw = np.concatenate([self._raw] + blocks, axis=1)
+        self.peak_bytes = max(self.peak_bytes, self._raw.nbytes)
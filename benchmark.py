@@ -0,0 +1,122 @@
+"""Benchmark memory use and speed per model and clip length.
+
+    python benchmark.py --models tiny base small medium --lengths 5 30 120 600
+    python benchmark.py --audio speech.wav --models medium
+
+Each model runs in its own process, so its RSS figures are not mixed up
+with other models', and a model that runs out of memory shows up as a
+failed cell instead of ending the benchmark.  Clips are cut from --audio
+(looped as needed) or synthesized, decoded like a recorded clip, and every
+run is also logged to the metrics log as a ``transcription`` record.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+SAMPLE_RATE = 16000
+
+
+def load_clip(audio_path, seconds):
+    """A clip of the given length from audio_path (looped) or synthesized"""
+    import numpy as np
+
+    if not audio_path:
+        from model_selection import synthetic_speech
+        return synthetic_speech(seconds)
+    import soundfile as sf
+    from audio_file import StreamingResampler
+
+    data, rate = sf.read(audio_path, dtype="float32", always_2d=True)
+    resampler = StreamingResampler(rate, SAMPLE_RATE)
+    audio = np.concatenate((resampler.process(data.mean(axis=1)), resampler.flush()))
+    needed = int(seconds * SAMPLE_RATE)
+    return np.tile(audio, -(-needed // len(audio)))[:needed]
+
+
+def run_model(name, lengths, audio_path):
+    """Worker process: load one model and decode each clip length, printing JSON lines"""
+    import model_store
+    from memory_usage import as_mib, current_rss
+    from transcription_engine import TranscriptionEngine
+
+    rss_before_load = current_rss()
+    model = model_store.load_model(name)
+    rss_after_load = current_rss()
+    engine = TranscriptionEngine(model, name)
+
+    # Warm-up run, so the first clip length does not pay for page-ins alone
+    builder = engine.new_feature_builder()
+    builder.feed(load_clip(audio_path, 5))
+    engine.transcribe_mel(builder.result(), metrics={"benchmark": True, "warmup": True})
+
+    for seconds in lengths:
+        builder = engine.new_feature_builder()
+        builder.feed(load_clip(audio_path, seconds))
+        result = engine.transcribe_mel(builder.result(), metrics={"benchmark": True})
+        row = dict(result["metrics"], clip_seconds=seconds,
+                   rss_before_load_mb=as_mib(rss_before_load),
+                   rss_after_load_mb=as_mib(rss_after_load))
+        print(json.dumps(row), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory and speed per model and clip length")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    parser.add_argument("--lengths", nargs="+", type=float, default=[5, 30, 120],
+                        help="clip lengths in seconds")
+    parser.add_argument("--audio", help="audio file to cut clips from (default: synthetic)")
+    parser.add_argument("--json", help="also write all results to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_model(args.worker, args.lengths, args.audio)
+        return 0
+
+    from memory_usage import as_mib, total_memory
+
+    results = {}
+    failures = {}
+    for name in args.models:
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        command = [sys.executable, __file__, "--worker", name, "--lengths"]
+        command += [str(seconds) for seconds in args.lengths]
+        if args.audio:
+            command += ["--audio", args.audio]
+        process = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+        for line in process.stdout.splitlines():
+            if line.startswith("{"):
+                row = json.loads(line)
+                results[(name, row["clip_seconds"])] = row
+        if process.returncode:
+            failures[name] = f"exit {process.returncode}"
+
+    print(f"\nPeak RSS in MiB (real-time factor); machine has {as_mib(total_memory())} MiB\n")
+    header = f"{'model':<10}{'loaded':>9}" + "".join(f"{f'{seconds:g} s':>18}" for seconds in args.lengths)
+    print(header)
+    print("-" * len(header))
+    for name in args.models:
+        rows = [results.get((name, seconds)) for seconds in args.lengths]
+        loaded = next((row["rss_after_load_mb"] for row in rows if row), None)
+        cells = []
+        for row in rows:
+            if row is None:
+                cells.append(failures.get(name, "-"))
+            else:
+                rtf = row["seconds"] / row["audio_seconds"] if row["audio_seconds"] else 0
+                cells.append(f"{row['peak_rss_mb']:.0f} ({rtf:.2f})")
+        print(f"{name:<10}{loaded if loaded is not None else '-':>9}" + "".join(f"{cell:>18}" for cell in cells))
+
+    mel_sizes = {seconds: row["mel_mb"] for (_, seconds), row in results.items()}
+    print("\nmel MiB per clip: " + ", ".join(f"{seconds:g} s: {mel_sizes[seconds]}"
+                                          for seconds in args.lengths if seconds in mel_sizes))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([results[key] for key in sorted(results)], f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class CaptureRingBuffer:
+    """Single-producer/single-consumer ring buffer for captured audio.
+
+    The audio callback is the only writer of ``_write_pos`` and the consumer
+    thread is the only writer of ``_read_pos``, so neither side ever takes a
+    lock.  When the consumer falls behind, new frames are dropped (and counted)
+    instead of blocking the callback.
+    """
+
+    def __init__(self, capacity_frames, channels=1, dtype=np.float32):
+        self.capacity = capacity_frames
+        self.channels = channels
+        self._buffer = np.zeros((capacity_frames, channels), dtype=dtype)
+        self._write_pos = 0  # total frames ever written
+        self._read_pos = 0   # total frames ever read
+
+        # Written by the producer only
+        self.overflows = 0
+        self.underruns = 0
+        self.dropped_frames = 0
+
+    def write(self, frames):
+        """Producer side: copy frames in, dropping whatever does not fit"""
+        frames = frames.reshape(-1, self.channels)
+        n = len(frames)
+        free = self.capacity - (self._write_pos - self._read_pos)
+        if n > free:
+            self.dropped_frames += n - free
+            n = free
+        if n <= 0:
+            return 0
+
+        start = self._write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._buffer[start:start + first] = frames[:first]
+        if n > first:
+            self._buffer[:n - first] = frames[first:n]
+
+        # Publish only after the data is in place
+        self._write_pos += n
+        return n
+
+    def record_status(self, overflow=False, underrun=False, dropped=0):
+        """Producer side: count device-reported overflow/underrun flags and frames lost upstream"""
+        if overflow:
+            self.overflows += 1
+        if underrun:
+            self.underruns += 1
+        self.dropped_frames += dropped
+
+    def read(self):
+        """Consumer side: return all pending frames as a new array, or None"""
+        write_pos = self._write_pos
+        available = write_pos - self._read_pos
+        if available <= 0:
+            return None
+
+        start = self._read_pos % self.capacity
+        first = min(available, self.capacity - start)
+        if first == available:
+            data = self._buffer[start:start + available].copy()
+        else:
+            data = np.concatenate((self._buffer[start:], self._buffer[:available - first]))
+
+        self._read_pos = write_pos
+        return data
+
+    @property
+    def nbytes(self):
+        """Memory held by the ring itself"""
+        return self._buffer.nbytes
+
+    def stats(self):
+        """Snapshot of the drop accounting counters"""
+        return {
+            "frames_captured": self._write_pos,
+            "overflows": self.overflows,
+            "underruns": self.underruns,
+            "dropped_frames": self.dropped_frames,
+        }
+
+    def drop_summary(self):
+        """Short human readable summary, or '' when no audio was lost"""
+        if not (self.overflows or self.underruns or self.dropped_frames):
+            return ""
+        return (f"audio lost: {self.dropped_frames} dropped frames, "
+                f"{self.overflows} overflows, {self.underruns} underruns")
@@ -0,0 +1,242 @@
+"""Audio capture in a separate process, handed over through shared memory.
+
+    TRANSCRIBE_CAPTURE_PROCESS=1 python speech_transcription_alt.py
+
+In the app's own process the audio callback competes for the GIL with
+torch, Tk and the decode threads, and a callback that runs late loses
+audio.  With ``TRANSCRIBE_CAPTURE_PROCESS=1`` the device stream lives in a
+small process of its own that only imports numpy and the audio library;
+its callback copies each block into a ring buffer in
+``multiprocessing.shared_memory`` and never waits for the app.  The app
+drains the ring every 10 ms; if it is held up, the ring (10 s by default)
+absorbs the delay, so a busy decoder adds latency but not gaps.  Frames
+cross the process boundary without pickling or pipes, and are handed on
+as views of the ring: the first copy the app makes is into the
+recording's capture buffer, as with an in-process stream.
+"""
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# int64 header fields
+WRITE_POS, READ_POS, OVERFLOWS, UNDERRUNS, DROPPED = range(5)
+HEADER_BYTES = 64
+
+
+class SharedRingBuffer:
+    """Single-producer/single-consumer frame ring in shared memory.
+
+    The same interface as CaptureRingBuffer; the producer and consumer may
+    be in different processes.  Each side only ever advances its own
+    position, and the producer publishes its position after the frames are
+    in place.
+    """
+
+    def __init__(self, capacity_frames, channels=1, dtype=np.float32, name=None):
+        self.capacity = int(capacity_frames)
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        size = HEADER_BYTES + self.capacity * channels * self.dtype.itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self._header = np.ndarray((8,), dtype=np.int64, buffer=self.shm.buf)
+        self._buffer = np.ndarray((self.capacity, channels), dtype=self.dtype, buffer=self.shm.buf,
+                                  offset=HEADER_BYTES)
+        if self.owner:
+            self._header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        """What another process needs to attach: (name, capacity, channels, dtype)"""
+        return self.name, self.capacity, self.channels, self.dtype.str
+
+    @classmethod
+    def attach(cls, name, capacity, channels, dtype):
+        return cls(capacity, channels, dtype, name=name)
+
+    def close(self):
+        # The views must go before the mapping can be closed
+        self._header = self._buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def write(self, frames):
+        """Producer side: copy frames in, dropping what does not fit; returns frames written"""
+        frames = frames.reshape(len(frames), -1)
+        header = self._header
+        write_pos = int(header[WRITE_POS])
+        n = min(len(frames), self.capacity - (write_pos - int(header[READ_POS])))
+        if n < len(frames):
+            header[DROPPED] += len(frames) - n
+        if n <= 0:
+            return 0
+        start = write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._buffer[start:start + first] = frames[:first]
+        if n > first:
+            self._buffer[:n - first] = frames[first:n]
+        header[WRITE_POS] = write_pos + n
+        return n
+
+    def record_status(self, overflow=False, underrun=False, dropped=0):
+        """Producer side: count device-reported overflow/underrun flags and frames lost upstream"""
+        if overflow:
+            self._header[OVERFLOWS] += 1
+        if underrun:
+            self._header[UNDERRUNS] += 1
+        self._header[DROPPED] += dropped
+
+    def peek(self):
+        """Consumer side: the pending frames as up to two views into the ring, oldest first.
+
+        The frames stay in place, and the producer cannot overwrite them,
+        until ``release`` is called.
+        """
+        header = self._header
+        available = int(header[WRITE_POS]) - int(header[READ_POS])
+        if available <= 0:
+            return []
+        start = int(header[READ_POS]) % self.capacity
+        first = min(available, self.capacity - start)
+        views = [self._buffer[start:start + first]]
+        if available > first:
+            views.append(self._buffer[:available - first])
+        return views
+
+    def release(self, frames):
+        """Consumer side: hand frames returned by ``peek`` back to the producer"""
+        self._header[READ_POS] += frames
+
+    def read(self):
+        """Consumer side: return all pending frames as a new array, or None"""
+        views = self.peek()
+        if not views:
+            return None
+        data = views[0].copy() if len(views) == 1 else np.concatenate(views)
+        self.release(len(data))
+        return data
+
+    @property
+    def nbytes(self):
+        return self._buffer.nbytes
+
+    def stats(self):
+        header = self._header
+        return {
+            "frames_captured": int(header[WRITE_POS]),
+            "overflows": int(header[OVERFLOWS]),
+            "underruns": int(header[UNDERRUNS]),
+            "dropped_frames": int(header[DROPPED]),
+        }
+
+
+def _capture_main(spec, backend, sample_rate, blocksize, stop_event, errors):
+    """Capture process: run the device stream into the shared ring until stop_event is set"""
+    ring = SharedRingBuffer.attach(*spec)
+    channels = ring.channels
+    try:
+        import fake_audio
+
+        if backend == "pyaudio":
+            pyaudio = fake_audio.pyaudio_module()
+
+            def callback(in_data, frame_count, time_info, status_flags):
+                if status_flags:
+                    ring.record_status(status_flags & pyaudio.paInputOverflow,
+                                       status_flags & pyaudio.paInputUnderflow)
+                ring.write(np.frombuffer(in_data, dtype=np.int16))
+                return (None, pyaudio.paContinue)
+
+            audio = pyaudio.PyAudio()
+            stream = audio.open(format=pyaudio.paInt16, channels=channels, rate=sample_rate, input=True,
+                                frames_per_buffer=blocksize or 1024, stream_callback=callback)
+        else:
+            sd = fake_audio.sounddevice_module()
+
+            def callback(indata, frames, time_info, status):
+                if status:
+                    ring.record_status(status.input_overflow, status.input_underflow)
+                ring.write(indata)
+
+            stream = sd.InputStream(callback=callback, channels=channels, samplerate=sample_rate,
+                                    blocksize=blocksize, dtype=ring.dtype.name)
+            stream.start()
+    except Exception as e:
+        errors.put(str(e))
+        ring.close()
+        return
+    errors.put(None)
+    try:
+        stop_event.wait()
+    finally:
+        stream.close()
+        ring.close()
+
+
+class CaptureProcess:
+    """A device input stream running in its own process.
+
+    Returned by an ``open_stream`` function for PersistentInput: a pump
+    thread drains the shared ring and calls ``on_frames(frames, overflow,
+    underflow, dropped)`` like a device callback would, with ``frames`` a
+    view of the ring that is released once the call returns and
+    ``dropped`` the frames the ring had to drop since the last call.
+    """
+
+    def __init__(self, on_frames, backend, sample_rate, channels=1, dtype=np.float32,
+                 ring_seconds=10, blocksize=0, poll=0.01, timeout=15.0):
+        self.on_frames = on_frames
+        self.poll = poll
+        self.ring = SharedRingBuffer(sample_rate * ring_seconds, channels, dtype)
+        context = multiprocessing.get_context("spawn")
+        self._stop = context.Event()
+        errors = context.Queue()
+        self.process = context.Process(
+            target=_capture_main, args=(self.ring.spec(), backend, sample_rate, blocksize, self._stop, errors),
+            name="audio-capture", daemon=True)
+        self.process.start()
+        try:
+            error = errors.get(timeout=timeout)
+        except Exception:
+            error = "capture process did not start"
+        if error:
+            self._stop.set()
+            self.process.join(1.0)
+            self.ring.close()
+            raise RuntimeError(error)
+        self._counts = (0, 0, 0)
+        self._pumping = threading.Event()
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        while not self._pumping.wait(self.poll):
+            views = self.ring.peek()
+            if views:
+                stats = self.ring.stats()
+                counts = (stats["overflows"], stats["underruns"], stats["dropped_frames"])
+                # Status changes go with the frames that follow them
+                self.on_frames(views[0], counts[0] > self._counts[0], counts[1] > self._counts[1],
+                               counts[2] - self._counts[2])
+                self._counts = counts
+                if len(views) > 1:
+                    self.on_frames(views[1], False, False, 0)
+                self.ring.release(sum(len(view) for view in views))
+            if not self.process.is_alive():
+                print("Audio capture process stopped")
+                return
+
+    def close(self):
+        self._pumping.set()
+        self._thread.join()
+        self._stop.set()
+        self.process.join(5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
@@ -0,0 +1,33 @@
+import threading
+
+
+class ClipRecording:
+    """One recording and everything it owns, from capture to decoding.
+
+    The apps make a new one for every recording and hand it from the
+    capture thread to the decoder; nothing in it is shared with the next
+    recording, which can therefore start while this one is still being
+    decoded.
+    """
+
+    def __init__(self, capture_buffer, mel_builder=None, dictation=None, archive=None):
+        self.capture_buffer = capture_buffer
+        self.mel_builder = mel_builder  # None in hands-free mode
+        self.dictation = dictation
+        self.archive = archive
+        self.audio_data = []  # captured blocks, frames x channels
+        self.audio_peak = 0.0
+        self.stop_event = threading.Event()
+        self.released = None  # set once the input stream no longer writes to capture_buffer
+        self.thread = None
+        self.timeout = None  # Tk after() id of the processing watchdog, once stopped
+
+    def stop(self, released):
+        """Tell the capture thread to finish once the input has let go of the buffer"""
+        self.released = released
+        self.stop_event.set()
+
+    def wait_until_captured(self):
+        """Wait for the capture thread to hand over the last frames"""
+        if self.thread is not None:
+            self.thread.join()
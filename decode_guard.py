@@ -0,0 +1,110 @@
+import collections
+import zlib
+
+from whisper.decoding import LogitFilter
+
+
+class RunawayGuard(LogitFilter):
+    """Ends a window's decode early when the output has run away.
+
+    On noise or music the decoder can loop on a phrase until the window's
+    token limit.  Installed as the last logit filter, the guard checks the
+    text decoded so far at every step for
+
+    - ``repetition``: the last tokens repeat with a short period,
+    - ``compression``: the text compresses better than
+      ``compression_ratio_threshold`` (checked every ``check_every`` steps),
+    - ``logprob``: the mean log-probability of the last ``logprob_window``
+      tokens is below ``logprob_threshold``,
+
+    and then forces end-of-text.  Rows are independent samples (best_of);
+    under beam search the beams are reordered every step, so all of them
+    are stopped together and the log-probability check is skipped.
+    """
+
+    def __init__(self, tokenizer, sample_begin, beam_search=False,
+                 compression_ratio_threshold=2.4, logprob_threshold=-2.0, logprob_window=32,
+                 max_period=24, min_repeats=4, min_repeat_tokens=24,
+                 min_compression_tokens=48, check_every=8):
+        self.tokenizer = tokenizer
+        self.sample_begin = sample_begin
+        self.beam_search = beam_search
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.logprob_threshold = logprob_threshold
+        self.logprob_window = logprob_window
+        self.max_period = max_period
+        self.min_repeats = min_repeats
+        self.min_repeat_tokens = min_repeat_tokens
+        self.min_compression_tokens = min_compression_tokens
+        self.check_every = check_every
+        self.reasons = None  # per row: why it was stopped, or None
+        self.keep = None  # per row: how many generated tokens are worth keeping
+        self._recent = None
+        self._logprobs = None
+
+    def apply(self, logits, tokens):
+        rows = tokens.shape[0]
+        if self.reasons is None:
+            self.reasons = [None] * rows
+            self.keep = [None] * rows
+            self._recent = [collections.deque(maxlen=self.logprob_window) for _ in range(rows)]
+        generated = tokens[:, self.sample_begin:].tolist()
+
+        track_logprobs = self.logprob_threshold is not None and not self.beam_search
+        if track_logprobs:
+            if self._logprobs is not None:
+                chosen = self._logprobs.gather(1, tokens[:, -1:]).squeeze(1).tolist()
+                for row in range(rows):
+                    self._recent[row].append(chosen[row])
+            self._logprobs = logits.float().log_softmax(dim=-1)
+
+        for row in range(rows):
+            if self.reasons[row] is None and self.tokenizer.eot not in generated[row]:
+                self._check(row, generated[row])
+        if self.beam_search and any(self.reasons):
+            self.reasons = [reason or "beam" for reason in self.reasons]
+
+        for row, reason in enumerate(self.reasons):
+            if reason is not None:
+                logits[row] = -float("inf")
+                logits[row, self.tokenizer.eot] = 0
+
+    def aborted(self):
+        """Why the decode was stopped, if every row was; else None"""
+        if self.reasons and all(self.reasons):
+            return self.reasons[0]
+        return None
+
+    def _check(self, row, generated):
+        # Timestamps change between repeats, so look at the text tokens only
+        positions = [i for i, token in enumerate(generated) if token < self.tokenizer.eot]
+        text = [generated[i] for i in positions]
+
+        loop_start = self._repetition(text)
+        if loop_start is not None:
+            # Keep the first time round the loop
+            self.reasons[row] = "repetition"
+            self.keep[row] = positions[loop_start]
+            return
+
+        if (self.compression_ratio_threshold is not None and len(text) >= self.min_compression_tokens
+                and len(generated) % self.check_every == 0):
+            data = self.tokenizer.decode(text).encode("utf-8")
+            if len(data) / len(zlib.compress(data)) > self.compression_ratio_threshold:
+                self.reasons[row] = "compression"
+                return
+
+        recent = self._recent[row]
+        if len(recent) == recent.maxlen and sum(recent) / len(recent) < self.logprob_threshold:
+            self.reasons[row] = "logprob"
+
+    def _repetition(self, text):
+        """Index where the second time round a loop at the end of text starts, or None"""
+        for period in range(1, self.max_period + 1):
+            span = max(self.min_repeats * period, self.min_repeat_tokens)
+            if span > len(text):
+                break
+            tail = text[len(text) - span:]
+            if tail[period:] == tail[:-period]:
+                return len(text) - span + period
+        return None
@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+class DecodeScheduler:
+    """Lets one decode run at a time, interactive clips before bulk work.
+
+    Live dictation and file imports share the CPU (and often the model), so
+    decodes take turns.  Bulk jobs ask for a turn per 30 s window with
+    ``iter_bulk`` and are only granted one while no interactive clip is
+    waiting; a clip recorded during a long import therefore waits for at
+    most the window in progress, and the import gets the leftover time.
+    """
+
+    INTERACTIVE = 0
+    BULK = 1
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._busy = False
+        self._waiting = [0, 0]
+
+    def slot(self, priority):
+        """Context manager holding the decoder; its ``wait_seconds`` is the time spent queued"""
+        return _Slot(self, priority)
+
+    def iter_bulk(self, iterable, stats=None):
+        """Yield the items of iterable, computing each one in a BULK slot.
+
+        Between items the decoder is free for interactive clips.  If given,
+        ``stats["wait_seconds"]`` accumulates the time spent giving way.
+        """
+        iterator = iter(iterable)
+        try:
+            while True:
+                with self.slot(self.BULK) as slot:
+                    item = next(iterator, _DONE)
+                if stats is not None:
+                    stats["wait_seconds"] = stats.get("wait_seconds", 0.0) + slot.wait_seconds
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    def interactive_waiting(self):
+        with self._condition:
+            return self._waiting[self.INTERACTIVE] > 0
+
+    def _acquire(self, priority):
+        with self._condition:
+            self._waiting[priority] += 1
+            try:
+                while self._busy or (priority == self.BULK and self._waiting[self.INTERACTIVE]):
+                    self._condition.wait()
+            finally:
+                self._waiting[priority] -= 1
+            self._busy = True
+
+    def _release(self):
+        with self._condition:
+            self._busy = False
+            self._condition.notify_all()
+
+
+class _Slot:
+    def __init__(self, scheduler, priority):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.wait_seconds = 0.0
+
+    def __enter__(self):
+        start_time = time.perf_counter()
+        self.scheduler._acquire(self.priority)
+        self.wait_seconds = time.perf_counter() - start_time
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.scheduler._release()
+        return False
+
+
+_DONE = object()
@@ -0,0 +1,533 @@
+"""Fake capture devices, a session recorder and a headless replay harness.
+
+    TRANSCRIBE_FAKE_AUDIO=speech.wav python speech_transcription_fast.py
+    TRANSCRIBE_FAKE_AUDIO=tone:440 TRANSCRIBE_FAKE_JITTER=0.005 TRANSCRIBE_FAKE_OVERFLOWS=0.01 python ...
+    TRANSCRIBE_RECORD_SESSION=~/sessions python speech_transcription.py
+    python fake_audio.py replay ~/sessions/session-20250101-120000.wav --model tiny
+
+With ``TRANSCRIBE_FAKE_AUDIO`` set, the apps get a stand-in for
+sounddevice or PyAudio whose input streams call back with blocks of the
+source at the rate a sound card would, late by random jitter, and with
+blocks dropped and flagged as input overflows at the given rate.  A
+source is an audio file, ``tone:<hz>[+<hz>...]``, ``noise``, ``speech``
+(synthetic phrases separated by pauses) or ``silence``; after it ends the
+device delivers silence.
+
+With ``TRANSCRIBE_RECORD_SESSION`` set to a folder, the real device is
+used and every stream is saved as ``session-<time>.wav`` plus
+``.timing.jsonl`` with the time, size and status flags of each callback.
+Replaying that file reproduces the callbacks as they happened.
+
+``replay`` runs the hands-free capture path (ring buffer, endpointing,
+feature extraction, decoding) against the fake device without a window,
+and reports the latency from the end of each phrase to its text.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import types
+from datetime import datetime
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+DEFAULT_BLOCKSIZE = 512
+
+# PortAudio values, as used by PyAudio
+paInt16 = 8
+paContinue = 0
+paComplete = 1
+paInputUnderflow = 1
+paInputOverflow = 2
+
+
+def fake_audio_source():
+    """The source given in TRANSCRIBE_FAKE_AUDIO, or None for the real device"""
+    return os.environ.get("TRANSCRIBE_FAKE_AUDIO") or None
+
+
+def timing_path(path):
+    return path + ".timing.jsonl"
+
+
+def load_source(spec, sample_rate=SAMPLE_RATE, seconds=30.0, seed=0):
+    """Mono float32 samples for a source spec"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    if spec == "silence":
+        return np.zeros(n, dtype=np.float32)
+    if spec == "noise":
+        return (0.05 * rng.standard_normal(n)).astype(np.float32)
+    if spec == "speech":
+        from model_selection import synthetic_speech
+        # 3 s phrases with 1.5 s pauses, so endpointing has something to cut
+        phrase = int(3.0 * sample_rate)
+        pause = int(1.5 * sample_rate)
+        audio = np.zeros(n, dtype=np.float32)
+        for i, start in enumerate(range(pause, n - phrase, phrase + pause)):
+            audio[start:start + phrase] = synthetic_speech(3.0, sample_rate, seed=seed + i)
+        return audio
+    if spec.startswith("tone:"):
+        t = np.arange(n) / sample_rate
+        tones = [np.sin(2 * np.pi * float(hz) * t) for hz in spec[5:].split("+")]
+        return (0.1 * sum(tones) / len(tones)).astype(np.float32)
+
+    import soundfile as sf
+    from audio_file import StreamingResampler
+
+    data, rate = sf.read(spec, dtype="float32", always_2d=True)
+    resampler = StreamingResampler(rate, sample_rate)
+    return np.concatenate((resampler.process(data.mean(axis=1)), resampler.flush()))
+
+
+def load_timing(spec, sample_rate):
+    """Callback records saved with a session recording at this sample rate, or None"""
+    try:
+        with open(timing_path(spec), encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("sample_rate") != sample_rate:
+                return None
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return None
+
+
+class CallbackFlags:
+    """Stands in for sounddevice.CallbackFlags"""
+
+    def __init__(self, input_overflow=False, input_underflow=False):
+        self.input_overflow = input_overflow
+        self.input_underflow = input_underflow
+
+    def __bool__(self):
+        return self.input_overflow or self.input_underflow
+
+
+class FakeDevice:
+    """Produces a source's audio in callback-sized blocks on the sound card's schedule.
+
+    ``jitter`` is the standard deviation in seconds of how late each
+    callback runs (the sample clock itself does not drift); ``overflows`` is
+    the probability that a block is lost, which the next callback reports
+    as an input overflow.  Both default to the TRANSCRIBE_FAKE_JITTER and
+    TRANSCRIBE_FAKE_OVERFLOWS variables.
+    """
+
+    def __init__(self, source=None, sample_rate=SAMPLE_RATE, blocksize=DEFAULT_BLOCKSIZE,
+                 jitter=None, overflows=None, seed=0):
+        self.source = source or fake_audio_source() or "speech"
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize or DEFAULT_BLOCKSIZE
+        if jitter is None:
+            jitter = float(os.environ.get("TRANSCRIBE_FAKE_JITTER", "0.002"))
+        if overflows is None:
+            overflows = float(os.environ.get("TRANSCRIBE_FAKE_OVERFLOWS", "0"))
+        self.jitter = jitter
+        self.overflows = overflows
+        self.rng = np.random.default_rng(seed)
+        self.audio = load_source(self.source, sample_rate, seed=seed)
+        self.timing = load_timing(self.source, sample_rate)
+        self.duration = len(self.audio) / sample_rate
+
+    def blocks(self):
+        """Yield (due seconds after start, samples, overflow, underflow), endlessly"""
+        position = 0
+        due = 0.0
+        for entry in self.timing or ():
+            block = self.audio[position:position + entry["frames"]]
+            position += len(block)
+            due = entry["t"]
+            yield due, block, entry.get("overflow", False), entry.get("underflow", False)
+        lost = False
+        while True:
+            block = self.audio[position:position + self.blocksize]
+            if len(block) < self.blocksize:
+                block = np.concatenate((block, np.zeros(self.blocksize - len(block), dtype=np.float32)))
+            position += self.blocksize
+            due += self.blocksize / self.sample_rate
+            if self.overflows and self.rng.random() < self.overflows:
+                lost = True
+                continue
+            yield due, block, lost, False
+            lost = False
+
+    def run(self, deliver, stop_event):
+        """Call deliver(samples, overflow, underflow, adc_time) on schedule until stop_event is set"""
+        start_time = time.monotonic()
+        for due, block, overflow, underflow in self.blocks():
+            late = abs(self.rng.normal(0.0, self.jitter)) if self.jitter else 0.0
+            delay = start_time + due + late - time.monotonic()
+            if stop_event.wait(max(delay, 0.0)):
+                return
+            deliver(block, overflow, underflow, start_time + due)
+
+
+class _FakeStream:
+    """Runs a FakeDevice on its own thread, like a sound card's callback thread"""
+
+    def __init__(self, sample_rate, channels, dtype, blocksize):
+        self.device = FakeDevice(sample_rate=sample_rate, blocksize=blocksize)
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _convert(self, block):
+        block = np.repeat(block.reshape(-1, 1), self.channels, axis=1)
+        if self.dtype == np.int16:
+            return (np.clip(block, -1.0, 1.0) * 32767).astype(np.int16)
+        return block.astype(self.dtype)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.device.run, args=(self._deliver, self._stop),
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def is_active(self):
+        return self._thread is not None and not self._stop.is_set()
+
+
+class FakeInputStream(_FakeStream):
+    """Stands in for sounddevice.InputStream (callback mode)"""
+
+    def __init__(self, samplerate=None, blocksize=None, device=None, channels=1, dtype="float32",
+                 callback=None, **kwargs):
+        super().__init__(samplerate or SAMPLE_RATE, channels, dtype, blocksize)
+        self.callback = callback
+
+    def _deliver(self, block, overflow, underflow, adc_time):
+        indata = self._convert(block)
+        time_info = types.SimpleNamespace(inputBufferAdcTime=adc_time, currentTime=time.monotonic(),
+                                          outputBufferDacTime=0.0)
+        self.callback(indata, len(indata), time_info, CallbackFlags(overflow, underflow))
+
+    def close(self):
+        self.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class FakePyAudio:
+    """Stands in for pyaudio.PyAudio"""
+
+    def open(self, format=paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+             frames_per_buffer=1024, stream_callback=None, start=True, **kwargs):
+        stream = FakePyAudioStream(rate, channels, frames_per_buffer, stream_callback)
+        if start:
+            stream.start_stream()
+        return stream
+
+    def get_sample_size(self, format):
+        return 2
+
+    def terminate(self):
+        pass
+
+
+class FakePyAudioStream(_FakeStream):
+    """Stands in for a PyAudio input stream, in callback or blocking (read) mode"""
+
+    def __init__(self, rate, channels, frames_per_buffer, stream_callback):
+        super().__init__(rate, channels, np.int16, frames_per_buffer)
+        self.callback = stream_callback
+        self._pending = bytearray()
+        self._overflowed = False
+        self._available = threading.Condition()
+
+    def _deliver(self, block, overflow, underflow, adc_time):
+        in_data = self._convert(block).tobytes()
+        if self.callback is None:
+            with self._available:
+                self._pending += in_data
+                self._overflowed = self._overflowed or overflow
+                self._available.notify_all()
+            return
+        flags = (paInputOverflow if overflow else 0) | (paInputUnderflow if underflow else 0)
+        time_info = {"input_buffer_adc_time": adc_time, "current_time": time.monotonic(),
+                     "output_buffer_dac_time": 0.0}
+        _, status = self.callback(in_data, len(block), time_info, flags)
+        if status != paContinue:
+            self._stop.set()
+
+    def read(self, num_frames, exception_on_overflow=True):
+        size = num_frames * self.channels * 2
+        with self._available:
+            while len(self._pending) < size:
+                if not self._available.wait(timeout=5.0):
+                    raise IOError("Fake input stream stalled")
+            if self._overflowed and exception_on_overflow:
+                self._overflowed = False
+                raise IOError("Input overflowed")
+            data = bytes(self._pending[:size])
+            del self._pending[:size]
+        return data
+
+    def start_stream(self):
+        self.start()
+
+    def stop_stream(self):
+        self.stop()
+
+    def close(self):
+        self.stop()
+
+
+class SessionRecorder:
+    """Saves a capture session's audio plus the time, size and flags of every callback.
+
+    The audio callback only queues a copy of each block; a writer thread
+    does the file I/O.
+    """
+
+    def __init__(self, directory, sample_rate, channels):
+        directory = os.path.expanduser(directory)
+        os.makedirs(directory, exist_ok=True)
+        name = datetime.now().strftime("session-%Y%m%d-%H%M%S")
+        self.path = os.path.join(directory, name + ".wav")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._blocks = queue.SimpleQueue()
+        self._start_time = None
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def record(self, frames, overflow=False, underflow=False):
+        """Audio callback side: queue one block (frames x channels)"""
+        now = time.monotonic()
+        if self._start_time is None:
+            self._start_time = now
+        self._blocks.put((now - self._start_time, np.array(frames, copy=True), bool(overflow), bool(underflow)))
+
+    def close(self):
+        self._blocks.put(None)
+        self._thread.join()
+
+    def _write(self):
+        import soundfile as sf
+
+        with sf.SoundFile(self.path, "w", self.sample_rate, self.channels, subtype="PCM_16") as audio, \
+                open(timing_path(self.path), "w", encoding="utf-8") as log:
+            log.write(json.dumps({"sample_rate": self.sample_rate, "channels": self.channels,
+                                  "started": time.time()}) + "\n")
+            while True:
+                item = self._blocks.get()
+                if item is None:
+                    break
+                t, frames, overflow, underflow = item
+                audio.write(frames.reshape(-1, self.channels))
+                log.write(json.dumps({"t": round(t, 6), "frames": len(frames),
+                                      "overflow": overflow, "underflow": underflow}) + "\n")
+        print(f"Recorded session: {self.path}")
+
+
+class _RecordingInputStream:
+    """A real sounddevice.InputStream whose callback also feeds a SessionRecorder"""
+
+    def __init__(self, sd, directory, callback=None, samplerate=None, channels=1, **kwargs):
+        self.recorder = SessionRecorder(directory, int(samplerate or SAMPLE_RATE), channels)
+
+        def recording_callback(indata, frames, time_info, status):
+            self.recorder.record(indata, status.input_overflow, status.input_underflow)
+            callback(indata, frames, time_info, status)
+
+        self.stream = sd.InputStream(callback=recording_callback, samplerate=samplerate,
+                                     channels=channels, **kwargs)
+
+    def start(self):
+        self.stream.start()
+
+    def stop(self):
+        self.stream.stop()
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.recorder.close()
+
+    def __enter__(self):
+        self.stream.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return self.stream.__exit__(exc_type, exc, tb)
+        finally:
+            self.recorder.close()
+
+
+class _RecordingPyAudio:
+    """A real pyaudio.PyAudio whose input streams also feed a SessionRecorder"""
+
+    def __init__(self, pyaudio, directory):
+        self.audio = pyaudio.PyAudio()
+        self.directory = directory
+
+    def open(self, rate=SAMPLE_RATE, channels=1, stream_callback=None, **kwargs):
+        recorder = SessionRecorder(self.directory, rate, channels)
+
+        def recording_callback(in_data, frame_count, time_info, status_flags):
+            recorder.record(np.frombuffer(in_data, dtype=np.int16).reshape(-1, channels),
+                            status_flags & paInputOverflow, status_flags & paInputUnderflow)
+            return stream_callback(in_data, frame_count, time_info, status_flags)
+
+        stream = self.audio.open(rate=rate, channels=channels, stream_callback=recording_callback, **kwargs)
+        close = stream.close
+
+        def close_and_save():
+            close()
+            recorder.close()
+
+        stream.close = close_and_save
+        return stream
+
+    def __getattr__(self, name):
+        return getattr(self.audio, name)
+
+
+def sounddevice_module():
+    """sounddevice, the fake device, or sounddevice with session recording, per the environment"""
+    if fake_audio_source():
+        return types.SimpleNamespace(InputStream=FakeInputStream, CallbackFlags=CallbackFlags,
+                                     sleep=lambda msec: time.sleep(msec / 1000))
+    import sounddevice as sd
+    directory = os.environ.get("TRANSCRIBE_RECORD_SESSION")
+    if not directory:
+        return sd
+    return types.SimpleNamespace(
+        InputStream=lambda **kwargs: _RecordingInputStream(sd, directory, **kwargs),
+        CallbackFlags=sd.CallbackFlags, sleep=sd.sleep)
+
+
+def pyaudio_module():
+    """PyAudio, the fake device, or PyAudio with session recording, per the environment"""
+    constants = dict(paInt16=paInt16, paContinue=paContinue, paComplete=paComplete,
+                     paInputOverflow=paInputOverflow, paInputUnderflow=paInputUnderflow)
+    if fake_audio_source():
+        return types.SimpleNamespace(PyAudio=FakePyAudio, **constants)
+    import pyaudio
+    directory = os.environ.get("TRANSCRIBE_RECORD_SESSION")
+    if not directory:
+        return pyaudio
+    return types.SimpleNamespace(PyAudio=lambda: _RecordingPyAudio(pyaudio, directory), **constants)
+
+
+def replay(source, model_name="tiny", jitter=None, overflows=None, seed=0, seconds=None,
+           min_silence=0.7, drain_interval=0.1):
+    """Run hands-free capture and transcription against a fake device; returns per-phrase records"""
+    import model_store
+    from capture_buffer import CaptureRingBuffer
+    from transcription_engine import TranscriptionEngine
+    from utterance_endpointing import ContinuousDictation
+
+    engine = TranscriptionEngine(model_store.load_model(model_name), model_name)
+    device = FakeDevice(source, SAMPLE_RATE, jitter=jitter, overflows=overflows, seed=seed)
+    seconds = seconds or device.duration
+    capture_buffer = CaptureRingBuffer(SAMPLE_RATE * 10, 1)
+    utterances = queue.Queue()
+    results = []
+    position = [0]  # frames fed to endpointing so far
+    start_time = [None]
+
+    def on_utterance(utterance):
+        # Endpointing fires min_silence after the phrase ended
+        speech_end = start_time[0] + position[0] / SAMPLE_RATE - min_silence
+        utterances.put(dict(utterance, speech_end=speech_end, detected=time.monotonic()))
+
+    def transcribe():
+        while True:
+            utterance = utterances.get()
+            if utterance is None:
+                return
+            result = engine.transcribe_mel(utterance["mel_builder"].result(), metrics={"replay": True})
+            done = time.monotonic()
+            results.append({
+                "phrase_end": round(utterance["speech_end"] - start_time[0], 2),
+                "duration": utterance["duration"],
+                "endpoint_delay": utterance["detected"] - utterance["speech_end"],
+                "decode": result["metrics"]["seconds"],
+                "latency": done - utterance["speech_end"],
+                "text": result["text"].strip(),
+            })
+
+    worker = threading.Thread(target=transcribe, daemon=True)
+    worker.start()
+    dictation = ContinuousDictation(engine, on_utterance, SAMPLE_RATE, min_silence=min_silence)
+    stop_event = threading.Event()
+
+    def deliver(block, overflow, underflow, adc_time):
+        if start_time[0] is None:
+            start_time[0] = adc_time
+        capture_buffer.record_status(overflow, underflow)
+        capture_buffer.write(block.reshape(-1, 1))
+
+    capture = threading.Thread(target=device.run, args=(deliver, stop_event), daemon=True)
+    capture.start()
+    # Drain like the apps' record_audio loop, feeding 10 ms at a time so phrase ends are placed precisely
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        time.sleep(drain_interval)
+        data = capture_buffer.read()
+        if data is None:
+            continue
+        for chunk in np.array_split(data[:, 0], max(1, len(data) // (SAMPLE_RATE // 100))):
+            position[0] += len(chunk)
+            dictation.feed(chunk)
+    stop_event.set()
+    capture.join()
+    dictation.flush()
+    utterances.put(None)
+    worker.join()
+    return results, capture_buffer.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake capture device tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay_parser = sub.add_parser("replay", help="measure phrase-to-text latency without a microphone")
+    replay_parser.add_argument("source", nargs="?", default="speech",
+                               help="audio file, tone:<hz>, noise, speech or silence (default: speech)")
+    replay_parser.add_argument("-m", "--model", default="tiny")
+    replay_parser.add_argument("--seconds", type=float, help="how long to capture (default: the source)")
+    replay_parser.add_argument("--jitter", type=float, help="callback lateness std dev in seconds")
+    replay_parser.add_argument("--overflows", type=float, help="probability of losing each block")
+    replay_parser.add_argument("--seed", type=int, default=0)
+    replay_parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results, capture = replay(args.source, args.model, args.jitter, args.overflows, args.seed, args.seconds)
+    print(f"{'phrase end':>10}{'length':>8}{'endpoint':>10}{'decode':>8}{'latency':>9}  text")
+    for result in results:
+        print(f"{result['phrase_end']:>10.2f}{result['duration']:>8.2f}{result['endpoint_delay']:>10.2f}"
+              f"{result['decode']:>8.2f}{result['latency']:>9.2f}  {result['text'][:40]}")
+    if results:
+        latencies = [result["latency"] for result in results]
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"\nlatency p50 {p50:.2f}s, p95 {p95:.2f}s, max {max(latencies):.2f}s")
+    print("capture: " + ", ".join(f"{key} {value}" for key, value in capture.items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"phrases": results, "capture": capture}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import threading
+
+import numpy as np
+
+
+class RollingBuffer:
+    """Keeps the most recent ``capacity`` frames, overwriting the oldest"""
+
+    def __init__(self, capacity, channels=1, dtype=np.float32):
+        self.capacity = max(1, capacity)
+        self._buffer = np.zeros((self.capacity, channels), dtype=dtype)
+        self._written = 0
+
+    def write(self, frames):
+        frames = frames.reshape(len(frames), -1)[-self.capacity:]
+        start = self._written % self.capacity
+        first = min(len(frames), self.capacity - start)
+        self._buffer[start:start + first] = frames[:first]
+        self._buffer[:len(frames) - first] = frames[first:]
+        self._written += len(frames)
+
+    def latest(self, frames=None):
+        """The last ``frames`` buffered frames (default all), oldest first"""
+        count = min(self._written, self.capacity)
+        if frames is not None:
+            count = min(count, frames)
+        if count <= 0:
+            return self._buffer[:0].copy()
+        start = (self._written - count) % self.capacity
+        if start + count <= self.capacity:
+            return self._buffer[start:start + count].copy()
+        return np.concatenate((self._buffer[start:], self._buffer[:start + count - self.capacity]))
+
+
+class PersistentInput:
+    """An input stream kept open between recordings, with a rolling pre-roll.
+
+    Opening a device stream takes hundreds of milliseconds, so the stream is
+    opened once and the device callback always keeps the last ``pre_roll``
+    seconds.  ``start`` hands the callback a capture buffer; from its next
+    block on, the callback writes the pre-roll and then every block into
+    it, so the first syllable is kept even if it began just before the
+    click.  ``stop`` takes the buffer away again; its event is set once the
+    callback has let go of it, i.e. within one block.
+
+    Only the callback changes which buffer is being filled: ``start`` and
+    ``stop`` post requests it picks up, so it never takes a lock.  They must
+    be called from one thread (the Tk thread in the apps).  A ``start``
+    right after a ``stop`` hands over between two blocks: the new buffer
+    gets only the audio the old one did not, so back-to-back recordings
+    neither overlap nor leave a gap.
+
+    ``open_stream(on_frames)`` must open and start the device stream,
+    calling ``on_frames(frames, overflow, underflow, dropped=0)`` from its
+    callback with frames x channels arrays (``dropped`` counts frames lost
+    before they reached it), and return an object with ``close()``.
+    ``frames`` is only valid during the call.
+    """
+
+    def __init__(self, open_stream, sample_rate, channels=1, dtype=np.float32, pre_roll=0.3):
+        self.open_stream = open_stream
+        self.sample_rate = sample_rate
+        self._pre_roll = RollingBuffer(int(pre_roll * sample_rate), channels, dtype)
+        self._idle_frames = self._pre_roll.capacity  # frames since a buffer was last filled
+        self._stream = None
+        # [capture buffer or None, event set once it is handled, the request before it]
+        self._request = None
+        self._handled = None
+        self._target = None
+
+    @property
+    def is_open(self):
+        return self._stream is not None
+
+    def open(self):
+        if self._stream is None:
+            self._stream = self.open_stream(self._on_frames)
+
+    def close(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.close()
+        self._target = None
+        self._settle(self._request)
+
+    def start(self, capture_buffer):
+        """Start filling capture_buffer, beginning with the pre-roll; does not wait"""
+        self.open()
+        return self._post(capture_buffer)
+
+    def stop(self, timeout=0.5):
+        """Stop filling the current buffer, waiting up to timeout (0: not at all).
+
+        Returns an event that is set once the callback no longer writes to
+        the buffer.
+        """
+        handled = self._post(None)
+        if self._stream is not None and timeout:
+            handled.wait(timeout)
+        return handled
+
+    def _post(self, capture_buffer):
+        request = [capture_buffer, threading.Event(), self._request]
+        self._request = request
+        return request[1]
+
+    def _settle(self, request):
+        """Mark request and those posted before it, back to the last one handled, as handled"""
+        handled, self._handled = self._handled, request
+        while request is not None and request is not handled:
+            request[1].set()
+            # Handled requests are dropped, so they do not keep their buffers alive
+            request[2], request = None, request[2]
+
+    def _on_frames(self, frames, overflow, underflow, dropped=0):
+        request = self._request
+        if request is not self._handled:
+            target = request[0]
+            if target is not None and self._target is None and self._idle_frames:
+                target.write(self._pre_roll.latest(self._idle_frames))
+            self._target = target
+            self._settle(request)
+        target = self._target
+        if target is not None:
+            if overflow or underflow or dropped:
+                target.record_status(overflow, underflow, dropped)
+            target.write(frames)
+            self._idle_frames = 0
+        else:
+            self._idle_frames += len(frames)
+        self._pre_roll.write(frames)
@@ -0,0 +1,161 @@
+"""Profile the next few transcription jobs of a real session.
+
+    TRANSCRIBE_PROFILE_JOBS=3 python speech_transcription_alt.py
+    TRANSCRIBE_PROFILE_JOBS=1 TRANSCRIBE_PROFILE_MEMORY=1 python speech_transcription.py
+    python speech_transcription_alt.py --profile 3 --profile-memory
+
+Control-Alt-P in the app profiles the next recording as well.  Each
+profiled job leaves, in ``~/.speech_transcription/profiles`` (override with
+``TRANSCRIBE_PROFILE_DIR``), the captured audio as ``<job>.wav`` and next
+to it ``<job>.prof`` (cProfile data, for pstats or snakeviz), ``<job>.txt``
+(the 40 most expensive functions by cumulative time) and, with memory
+tracing, ``<job>-memory.txt`` (peak traced memory and the 40 largest
+allocation sites still held at the end of the job).
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import wave
+from datetime import datetime
+
+from app_paths import data_dir
+
+
+def default_profile_dir():
+    path = os.environ.get("TRANSCRIBE_PROFILE_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        return path
+    return data_dir("profiles")
+
+
+class JobProfiler:
+    """Wraps the next ``count`` jobs in cProfile and, optionally, tracemalloc.
+
+    Only one job is profiled at a time; a job that starts while another is
+    being profiled runs unprofiled and does not use up the count.
+    """
+
+    def __init__(self, count=None, trace_memory=None, directory=None):
+        if count is None:
+            count = int(os.environ.get("TRANSCRIBE_PROFILE_JOBS", "0") or 0)
+        if trace_memory is None:
+            trace_memory = os.environ.get("TRANSCRIBE_PROFILE_MEMORY") == "1"
+        self.remaining = count
+        self.trace_memory = trace_memory
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._active = False
+
+    def arm(self, count=1, trace_memory=None):
+        """Profile the next count jobs"""
+        with self._lock:
+            self.remaining = count
+            if trace_memory is not None:
+                self.trace_memory = trace_memory
+
+    def job(self, name, audio=None, sample_rate=16000):
+        """Context manager around one job; ``audio`` is a function returning its samples"""
+        return _ProfiledJob(self, name, audio, sample_rate)
+
+    def _claim(self):
+        with self._lock:
+            if self.remaining <= 0 or self._active:
+                return False
+            self.remaining -= 1
+            self._active = True
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._active = False
+
+
+class _ProfiledJob:
+    def __init__(self, profiler, name, audio, sample_rate):
+        self.profiler = profiler
+        self.name = name
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.profile = None
+        self.trace_memory = False
+        self.path = None
+
+    def __enter__(self):
+        if not self.profiler._claim():
+            return self
+        self.trace_memory = self.profiler.trace_memory and not tracemalloc.is_tracing()
+        if self.trace_memory:
+            tracemalloc.start(25)
+        self.profile = cProfile.Profile()
+        self.start_time = time.perf_counter()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Another profiler is active in this process
+            self.profile = None
+            self._stop_tracing()
+            self.profiler._release()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profile is None:
+            return False
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.start_time
+        snapshot = peak = None
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        self._stop_tracing()
+        try:
+            self._save(elapsed, snapshot, peak)
+        except Exception as e:
+            print(f"Profile error: {e}")
+        finally:
+            self.profiler._release()
+        return False
+
+    def _stop_tracing(self):
+        if self.trace_memory:
+            tracemalloc.stop()
+            self.trace_memory = False
+
+    def _save(self, elapsed, snapshot, peak):
+        directory = self.profiler.directory or default_profile_dir()
+        base = os.path.join(directory, datetime.now().strftime(f"%Y%m%d-%H%M%S-{self.name}"))
+        self.path = base + ".prof"
+        if self.audio is not None:
+            write_wav(base + ".wav", self.audio(), self.sample_rate)
+        self.profile.dump_stats(self.path)
+        report = io.StringIO()
+        report.write(f"{self.name}: {elapsed:.2f}s\n")
+        pstats.Stats(self.profile, stream=report).sort_stats("cumulative").print_stats(40)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        if snapshot is not None:
+            with open(base + "-memory.txt", "w", encoding="utf-8") as f:
+                f.write(f"peak traced: {peak / 2**20:.1f} MiB\n\n")
+                for stat in snapshot.statistics("traceback")[:40]:
+                    f.write(f"{stat.size / 2**20:.2f} MiB in {stat.count} blocks\n")
+                    f.write("\n".join(stat.traceback.format(limit=8)) + "\n\n")
+        print(f"Profile saved: {self.path}")
+
+
+def write_wav(path, samples, sample_rate):
+    """Write float (-1..1) or int16 samples, frames x channels, as 16-bit PCM"""
+    import numpy as np
+
+    samples = np.asarray(samples)
+    if samples.dtype != np.int16:
+        samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    samples = samples.reshape(len(samples), -1)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
@@ -0,0 +1,186 @@
+"""Persistent transcription job queue in SQLite.
+
+Every state change is committed immediately, so after a crash the queue
+knows which files were finished.  Each watch process renews a lease on the
+jobs it is running; a running job is handed out again once its process is
+gone (on this host) or its lease has expired, so several processes can
+share one database without taking over each other's jobs.  Backlog and
+throughput can be read with any SQLite client from the ``job_stats`` view,
+e.g.::
+
+    sqlite3 ~/.speech_transcription/jobs.db "SELECT * FROM job_stats"
+"""
+import os
+import socket
+import sqlite3
+import time
+
+from app_paths import data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    output TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    audio_seconds REAL,
+    decode_seconds REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,  -- lease on a running job, renewed by its process
+    finished_at REAL,
+    UNIQUE (path, size, mtime_ns)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE VIEW IF NOT EXISTS job_stats AS
+SELECT
+    (SELECT COUNT(*) FROM jobs WHERE status = 'queued') AS queued,
+    (SELECT COUNT(*) FROM jobs WHERE status = 'running') AS running,
+    (SELECT COUNT(*) FROM jobs WHERE status = 'done') AS done,
+    (SELECT COUNT(*) FROM jobs WHERE status = 'failed') AS failed,
+    (SELECT COALESCE(SUM(audio_seconds), 0) FROM jobs
+        WHERE status = 'done' AND finished_at > strftime('%s', 'now') - 3600) AS audio_seconds_last_hour,
+    (SELECT COUNT(*) FROM jobs
+        WHERE status = 'done' AND finished_at > strftime('%s', 'now') - 3600) AS jobs_last_hour,
+    (SELECT SUM(decode_seconds) / SUM(audio_seconds) FROM jobs
+        WHERE status = 'done' AND audio_seconds > 0) AS realtime_factor,
+    (SELECT MIN(enqueued_at) FROM jobs WHERE status = 'queued') AS oldest_queued_at;
+"""
+
+
+def default_db_path():
+    """Location of the job database"""
+    return os.environ.get("TRANSCRIBE_JOB_DB", os.path.join(data_dir(), "jobs.db"))
+
+
+class JobQueue:
+    """SQLite-backed job queue; use one instance per thread"""
+
+    def __init__(self, path=None, max_attempts=3, lease=60.0):
+        self.path = path or default_db_path()
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        columns = [row["name"] for row in self.db.execute("PRAGMA table_info(jobs)")]
+        if "heartbeat_at" not in columns:
+            # Databases created before leases were added
+            try:
+                self.db.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            except sqlite3.OperationalError:
+                pass  # added by another process in the meantime
+
+    def close(self):
+        self.db.close()
+
+    def enqueue(self, path, size, mtime_ns, output):
+        """Add a job for this version of a file; returns False if it is already known"""
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO jobs (path, size, mtime_ns, output, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, output, time.time()))
+        return cursor.rowcount == 1
+
+    def heartbeat(self):
+        """Renew the lease on the jobs this process is running"""
+        self.db.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND (worker = ? OR substr(worker, 1, ?) = ?)",
+            (time.time(), self.worker_name, len(self.worker_name) + 1, self.worker_name + "/"))
+
+    def recover(self):
+        """Requeue running jobs whose process is gone; returns how many were requeued.
+
+        A job's process is gone if it ran on this host and no longer exists,
+        or if its lease was not renewed for ``lease`` seconds.  Jobs of other
+        live processes are left alone.  A job that has already been attempted
+        ``max_attempts`` times is marked failed instead, so one bad file
+        cannot crash the service forever.
+        """
+        now = time.time()
+        requeued = 0
+        with self._transaction():
+            rows = self.db.execute("SELECT * FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                if not self._orphaned(row, now):
+                    continue
+                if row["attempts"] >= self.max_attempts:
+                    self.db.execute(
+                        "UPDATE jobs SET status = 'failed', error = 'interrupted too many times', finished_at = ? "
+                        "WHERE id = ?", (now, row["id"]))
+                else:
+                    self.db.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?", (row["id"],))
+                    requeued += 1
+        return requeued
+
+    def _orphaned(self, row, now):
+        host, _, pid = (row["worker"] or "").split("/")[0].rpartition(":")
+        if host == socket.gethostname() and pid.isdigit():
+            if int(pid) == os.getpid():
+                return False
+            if os.name != "nt":
+                # Signal 0 only checks that the process exists (on Windows it would kill it)
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    return True
+                except OSError:
+                    pass
+        renewed = row["heartbeat_at"] or row["started_at"] or 0
+        return renewed < now - self.lease
+
+    def claim(self, worker=None):
+        """Atomically take the oldest queued job; returns its row or None"""
+        with self._transaction():
+            row = self.db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self.db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, started_at = ?, "
+                "heartbeat_at = ? WHERE id = ?", (worker or self.worker_name, now, now, row["id"]))
+        return row
+
+    def finish(self, job_id, audio_seconds, decode_seconds):
+        self.db.execute(
+            "UPDATE jobs SET status = 'done', error = NULL, audio_seconds = ?, decode_seconds = ?, "
+            "finished_at = ? WHERE id = ?", (audio_seconds, decode_seconds, time.time(), job_id))
+
+    def fail(self, job_id, error):
+        self.db.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+            (str(error), time.time(), job_id))
+
+    def retry_failed(self):
+        """Put failed jobs back in the queue; returns how many"""
+        cursor = self.db.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, error = NULL WHERE status = 'failed'")
+        return cursor.rowcount
+
+    def stats(self):
+        """Backlog and throughput figures from the job_stats view"""
+        return dict(self.db.execute("SELECT * FROM job_stats").fetchone())
+
+    def _transaction(self):
+        return _Transaction(self.db)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent claims never hand out the same job"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,236 @@
+"""Load test: replay a corpus of clips against the engine under concurrency.
+
+    python load_test.py --model tiny --concurrency 4 --rate 2 --requests 100
+    python load_test.py --corpus clips/ --concurrency 2 --rate 0 --duration 60
+
+Requests arrive as a Poisson process at --rate clips per second (0: all at
+once, to measure saturation throughput) and wait in a queue for one of
+--concurrency worker threads.  With --rate 0 and --duration the test runs
+closed-loop instead: a new clip is sent as soon as one finishes, so exactly
+--concurrency clips are in flight.  Each worker has its own engine, as in the
+watch-folder service, and computes the clip's features and decodes it.
+Clips are the audio files in --corpus (cycled) or synthesized at --lengths;
+nothing is downloaded.  The report gives throughput in audio seconds per
+second and p50/p95/p99 of latency (arrival to result), queue wait and
+decode time, plus error counts.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".opus", ".mp3", ".aiff", ".aif")
+
+
+def load_corpus(corpus, lengths):
+    """(name, samples) clips from the audio files under corpus, or synthesized"""
+    if not corpus:
+        from model_selection import synthetic_speech
+        return [(f"synthetic-{seconds:g}s", synthetic_speech(seconds, seed=i))
+                for i, seconds in enumerate(lengths)]
+
+    import soundfile as sf
+    from audio_file import StreamingResampler
+
+    paths = []
+    for path in corpus:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                paths += [os.path.join(dirpath, name) for name in sorted(filenames)
+                          if name.lower().endswith(AUDIO_EXTENSIONS)]
+        else:
+            paths.append(path)
+    clips = []
+    for path in paths:
+        data, rate = sf.read(path, dtype="float32", always_2d=True)
+        resampler = StreamingResampler(rate, SAMPLE_RATE)
+        audio = np.concatenate((resampler.process(data.mean(axis=1)), resampler.flush()))
+        clips.append((os.path.basename(path), audio))
+    return clips
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "max": max(values)}
+
+
+class LoadTest:
+    """Arrival generator, request queue and worker threads for one run"""
+
+    def __init__(self, model_name, clips, concurrency=1, rate=0.0, requests=50, duration=None, seed=0):
+        self.model_name = model_name
+        self.clips = clips
+        self.concurrency = concurrency
+        self.rate = rate
+        self.requests = requests
+        self.duration = duration
+        self.rng = np.random.default_rng(seed)
+        self.pending = queue.Queue()
+        self.results = []
+        self.errors = []
+        self._lock = threading.Lock()
+        self._ready = threading.Barrier(concurrency + 1)
+        # Closed loop: without a rate or a request count, arrivals wait for a free worker
+        self._slots = threading.Semaphore(concurrency) if rate <= 0 and duration is not None else None
+
+    def run(self):
+        """Run the test and return the report"""
+        workers = [threading.Thread(target=self._worker, args=(i,), daemon=True)
+                   for i in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        # Models are loaded and warmed up before the clock starts
+        self._ready.wait()
+        start_time = time.perf_counter()
+        self._generate(start_time)
+        for _ in workers:
+            self.pending.put(None)
+        for worker in workers:
+            worker.join()
+        return self.report(time.perf_counter() - start_time)
+
+    def _generate(self, start_time):
+        arrival = start_time
+        sent = 0
+        while self.requests is None or sent < self.requests:
+            if self.rate > 0:
+                arrival += self.rng.exponential(1.0 / self.rate)
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elif self._slots is not None:
+                remaining = start_time + self.duration - time.perf_counter()
+                if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+                    break
+            now = time.perf_counter()
+            if self.duration is not None and now - start_time >= self.duration:
+                break
+            name, audio = self.clips[sent % len(self.clips)]
+            self.pending.put({"clip": name, "audio": audio, "arrival": now})
+            sent += 1
+
+    def _worker(self, index):
+        import model_store
+        from transcription_engine import TranscriptionEngine
+
+        engine = None
+        try:
+            engine = TranscriptionEngine(model_store.load_model(self.model_name), self.model_name)
+            builder = engine.new_feature_builder()
+            builder.feed(self.clips[0][1][:5 * SAMPLE_RATE])
+            engine.transcribe_mel(builder.result(), metrics={"load_test": True, "warmup": True})
+        except Exception as e:
+            engine = None
+            with self._lock:
+                self.errors.append(f"worker {index}: {e}")
+        finally:
+            self._ready.wait()
+        if engine is None:
+            return
+
+        while True:
+            request = self.pending.get()
+            if request is None:
+                return
+            started = time.perf_counter()
+            try:
+                builder = engine.new_feature_builder()
+                builder.feed(request["audio"])
+                engine.transcribe_mel(builder.result(), metrics={
+                    "load_test": True, "concurrency": self.concurrency, "worker": index})
+            except Exception as e:
+                with self._lock:
+                    self.errors.append(f"{request['clip']}: {e}")
+                continue
+            finally:
+                if self._slots is not None:
+                    self._slots.release()
+            finished = time.perf_counter()
+            with self._lock:
+                self.results.append({
+                    "clip": request["clip"],
+                    "audio_seconds": len(request["audio"]) / SAMPLE_RATE,
+                    "queue_wait": started - request["arrival"],
+                    "decode": finished - started,
+                    "latency": finished - request["arrival"],
+                })
+
+    def report(self, elapsed):
+        audio_seconds = sum(result["audio_seconds"] for result in self.results)
+        return {
+            "model": self.model_name,
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "closed_loop": self._slots is not None,
+            "elapsed": elapsed,
+            "completed": len(self.results),
+            "errors": len(self.errors),
+            "error_messages": self.errors[:10],
+            "audio_seconds": audio_seconds,
+            "throughput": audio_seconds / elapsed if elapsed else 0.0,
+            "clips_per_second": len(self.results) / elapsed if elapsed else 0.0,
+            "latency": percentiles([result["latency"] for result in self.results]),
+            "queue_wait": percentiles([result["queue_wait"] for result in self.results]),
+            "decode": percentiles([result["decode"] for result in self.results]),
+        }
+
+
+def print_report(report):
+    if report["rate"]:
+        offered = f"{report['rate']:g} clips/s"
+    else:
+        offered = "closed-loop" if report["closed_loop"] else "all at once"
+    print(f"\n{report['model']}, concurrency {report['concurrency']}, arrivals {offered}")
+    print(f"{report['completed']} clips ({report['audio_seconds']:.0f}s of audio) in "
+          f"{report['elapsed']:.1f}s, {report['errors']} error(s)")
+    print(f"throughput: {report['throughput']:.2f} audio-s/s, {report['clips_per_second']:.2f} clips/s\n")
+    columns = ("p50", "p95", "p99", "max")
+    print(f"{'seconds':<12}" + "".join(f"{column:>10}" for column in columns))
+    for key in ("latency", "queue_wait", "decode"):
+        values = report[key]
+        print(f"{key:<12}" + "".join(f"{values[column]:>10.2f}" if values[column] is not None
+                                     else f"{'-':>10}" for column in columns))
+    for message in report["error_messages"]:
+        print(f"error: {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test of the transcription engine")
+    parser.add_argument("-m", "--model", default="tiny")
+    parser.add_argument("--corpus", nargs="+", help="audio files or folders to replay (default: synthetic)")
+    parser.add_argument("--lengths", nargs="+", type=float, default=[5, 10, 30],
+                        help="synthetic clip lengths in seconds")
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="worker threads")
+    parser.add_argument("-r", "--rate", type=float, default=0.0,
+                        help="mean arrivals per second (0: all at once, or closed-loop with --duration)")
+    parser.add_argument("-n", "--requests", type=int, help="clips to send (default: 50, or unlimited with --duration)")
+    parser.add_argument("--duration", type=float, help="stop sending after this many seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    clips = load_corpus(args.corpus, args.lengths)
+    if not clips:
+        parser.error("no audio files in the corpus")
+    requests = args.requests
+    if requests is None and args.duration is None:
+        requests = 50
+    test = LoadTest(args.model, clips, args.concurrency, args.rate, requests, args.duration, args.seed)
+    report = test.run()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import queue
+import threading
+
+import numpy as np
+from whisper.audio import HOP_LENGTH, N_FFT, N_FRAMES, mel_filters
+
+
+def normalize_log_mel(raw, max_value):
+    """Apply whisper's dynamic-range clamp and scaling to raw log10 mel frames"""
+    floor = max(max_value, -10.0) - 8.0
+    return (np.maximum(raw, floor) + 4.0) / 4.0
+
+
+def silence_frames(n_mels, count, max_value):
+    """Normalized frames for zero samples, which whisper pads clips with"""
+    # Zero samples have a raw log-mel of -10
+    value = (max(-10.0, max(max_value, -10.0) - 8.0) + 4.0) / 4.0
+    return np.full((n_mels, count), value, dtype=np.float32)
+
+
+class LogMelFrames:
+    """Streaming computation of whisper's raw (log10, un-normalized) mel frames.
+
+    Samples pushed with ``append`` are framed in vectorized STFT blocks; the
+    samples a frame still needs from the next block are carried over, so the
+    frames are identical to a one-shot ``log_mel_spectrogram`` over the whole
+    audio followed by whisper's zero padding.
+    """
+
+    def __init__(self, n_mels=80):
+        self.n_mels = n_mels
+        self._filters = mel_filters("cpu", n_mels).numpy()
+        # torch.hann_window is periodic
+        self._window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+        self._pad = N_FFT // 2
+
+        self._pending = np.zeros(0, dtype=np.float32)  # centre-padded samples not yet framed
+        self._started = False
+        self.num_samples = 0
+        self.num_frames = 0
+        self.max_value = -np.inf
+
+    def append(self, samples):
+        """Add mono float32 samples; returns the raw frames completed by them"""
+        self.num_samples += len(samples)
+        self._pending = np.concatenate((self._pending, samples))
+        if not self._started:
+            # Centred STFT: reflect-pad the start once enough audio is here
+            if len(self._pending) <= self._pad:
+                return self._empty()
+            self._pending = np.concatenate((self._pending[1:self._pad + 1][::-1], self._pending))
+            self._started = True
+        return self._compute(None)
+
+    def seek(self, frame, max_value=-np.inf):
+        """Continue a stream at ``frame`` instead of its start.
+
+        The samples appended next must start at sample ``frame * HOP_LENGTH -
+        N_FFT // 2`` of the audio, i.e. the first sample frame ``frame`` sees.
+        """
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._started = True
+        self.num_frames = frame
+        self.num_samples = frame * HOP_LENGTH - self._pad
+        self.max_value = max_value
+
+    @property
+    def content_frames(self):
+        """Frames that whisper counts as content; later frames belong to the padding"""
+        return self.num_samples // HOP_LENGTH
+
+    def flush(self):
+        """Return the trailing frames once the audio is complete.
+
+        This includes the few frames past ``content_frames`` whose window still
+        overlaps the end of the audio; all frames after those are silence.
+        """
+        if not self._started:
+            if not len(self._pending):
+                return self._empty()
+            self._pending = np.concatenate(
+                (np.zeros(self._pad, dtype=np.float32), self._pending))
+            self._started = True
+        # whisper pads the audio with zeros before the STFT, so the last frames see silence
+        self._pending = np.concatenate((self._pending, np.zeros(N_FFT, dtype=np.float32)))
+        last_frames = -(-(self.num_samples + self._pad) // HOP_LENGTH)
+        return self._compute(last_frames - self.num_frames)
+
+    def _empty(self):
+        return np.zeros((self.n_mels, 0), dtype=np.float32)
+
+    def _compute(self, limit):
+        """Frame, window and mel-project all complete frames in ``_pending``"""
+        n = (len(self._pending) - N_FFT) // HOP_LENGTH + 1 if len(self._pending) >= N_FFT else 0
+        if limit is not None:
+            n = min(n, limit)
+        if n <= 0:
+            return self._empty()
+
+        frames = np.lib.stride_tricks.sliding_window_view(
+            self._pending[:(n - 1) * HOP_LENGTH + N_FFT], N_FFT)[::HOP_LENGTH]
+        spectrum = np.fft.rfft(frames * self._window, axis=-1)
+        magnitudes = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        log_spec = np.log10(np.maximum(self._filters @ magnitudes.T, 1e-10))
+
+        self.num_frames += n
+        self.max_value = max(self.max_value, float(log_spec.max()))
+        self._pending = self._pending[n * HOP_LENGTH:]
+        return log_spec
+
+
+class PaddedMel:
+    """Window access to a complete mel that already carries whisper's padding"""
+
+    def __init__(self, mel):
+        self.mel = mel
+        self.content_frames = mel.shape[-1] - N_FRAMES
+
+    def window(self, seek):
+        """Return (mel window, number of content frames in it)"""
+        size = min(N_FRAMES, self.content_frames - seek)
+        if size <= 0:
+            return None, 0
+        return self.mel[:, seek:seek + N_FRAMES], size
+
+
+class IncrementalLogMel:
+    """Computes a clip's log-mel spectrogram on a background thread while audio arrives.
+
+    Audio handed to ``feed`` is queued and whatever has accumulated is turned
+    into frames in one block, so ``result`` only has to flush the last partial
+    block once recording stops.
+    """
+
+    def __init__(self, n_mels=80):
+        self._frames = LogMelFrames(n_mels)
+        self._input = queue.Queue()
+        self._blocks = []
+        self._result = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def num_frames(self):
+        return self._frames.num_frames
+
+    def feed(self, samples):
+        """Queue mono float32 samples (16 kHz) for feature extraction"""
+        self._input.put(np.asarray(samples, dtype=np.float32).reshape(-1))
+
+    def result(self):
+        """Finish the clip and return its normalized mel with Whisper's 30 s of silence padding"""
+        if self._result is None:
+            self._input.put(None)
+            self._thread.join()
+
+            max_value = self._frames.max_value
+            mel = normalize_log_mel(np.concatenate(self._blocks, axis=1), max_value)
+            self._blocks = []
+            tail = mel.shape[1] - self._frames.content_frames
+            padding = silence_frames(self._frames.n_mels, N_FRAMES - tail, max_value)
+            self._result = np.concatenate((mel, padding), axis=1)
+        return self._result
+
+    def _run(self):
+        """Worker loop: batch whatever audio is queued into one STFT block"""
+        finished = False
+        while not finished:
+            chunks = [self._input.get()]
+            while True:
+                try:
+                    chunks.append(self._input.get_nowait())
+                except queue.Empty:
+                    break
+            if chunks[-1] is None:
+                finished = True
+                chunks.pop()
+            if chunks:
+                self._blocks.append(self._frames.append(np.concatenate(chunks)))
+        self._blocks.append(self._frames.flush())
@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if it cannot be read"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def lifetime_peak_rss():
+    """Highest RSS this process has reached so far, in bytes (None if unknown)"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    return None
+
+
+def total_memory():
+    """Physical memory of the machine in bytes (None if unknown)"""
+    if psutil is not None:
+        return psutil.virtual_memory().total
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class PeakRSSMonitor:
+    """Measures RSS before a block of work and its peak while the block runs.
+
+    Current RSS is sampled on a background thread; if the process-lifetime
+    peak rises during the block, that exact figure is used instead, since
+    short spikes can fall between samples.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.rss_before = None
+        self.peak_rss = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.rss_before = current_rss()
+        self.peak_rss = self.rss_before
+        self._lifetime_before = lifetime_peak_rss()
+        if self.rss_before is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._update(current_rss())
+        lifetime_after = lifetime_peak_rss()
+        if lifetime_after is not None and self._lifetime_before is not None \
+                and lifetime_after > self._lifetime_before:
+            self._update(lifetime_after)
+        return False
+
+    def fields(self):
+        """Metrics record fields, in MiB"""
+        return {"rss_before_mb": as_mib(self.rss_before), "peak_rss_mb": as_mib(self.peak_rss)}
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._update(current_rss())
+
+    def _update(self, value):
+        if value is not None and (self.peak_rss is None or value > self.peak_rss):
+            self.peak_rss = value
+
+
+def as_mib(value):
+    return None if value is None else round(value / 2**20, 1)
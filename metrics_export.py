@@ -0,0 +1,284 @@
+"""In-process counters and histograms, exported in the Prometheus text format.
+
+    TRANSCRIBE_METRICS_PORT=9464 python speech_transcription_alt.py
+    TRANSCRIBE_METRICS_FILE=/var/lib/node_exporter/transcribe.prom python watch_folder.py watch ...
+    python metrics_export.py                  # the same figures, rebuilt from the metrics log
+
+Every metrics log record also updates the figures here (clips, audio and
+decode seconds, real-time factor, model loads, capture overflows, ...), and
+the apps add a few that are not logged per event (queue depth, engine
+cache hits).  With ``TRANSCRIBE_METRICS_PORT`` set they are served at
+``http://127.0.0.1:<port>/metrics``; with ``TRANSCRIBE_METRICS_FILE`` they
+are written to that file every ``TRANSCRIBE_METRICS_INTERVAL`` seconds
+(default 15) and on exit, for node_exporter's textfile collector.  Every
+series carries a ``version`` label (``TRANSCRIBE_VERSION``, or the git
+revision of this checkout) so regressions can be charted per release.
+"""
+import argparse
+import atexit
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "transcribe_"
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+HELP = {
+    "clips_total": "Clips transcribed",
+    "audio_seconds_total": "Seconds of audio transcribed",
+    "decode_seconds": "Time to transcribe a clip",
+    "rtf": "Real-time factor of a clip (decode seconds per audio second)",
+    "fallbacks_total": "Windows re-decoded at a higher temperature",
+    "aborts_total": "Windows whose decode was stopped as a runaway",
+    "scheduler_wait_seconds": "Time a recorded clip waited for the decoder",
+    "imports_total": "Audio files imported",
+    "import_audio_seconds_total": "Seconds of audio in imported files",
+    "jobs_total": "Watch-folder jobs finished",
+    "job_queue_wait_seconds": "Time a watch-folder job waited in the queue",
+    "queue_depth": "Clips or jobs waiting to be transcribed",
+    "model_loads_total": "Models loaded from the store",
+    "model_load_seconds": "Time to load a model",
+    "engine_cache_hits_total": "Model choices served by an already loaded engine",
+    "engine_cache_misses_total": "Model choices that needed a model to be loaded",
+    "capture_overflows_total": "Input overflows reported by the audio device",
+    "capture_underruns_total": "Input underruns reported by the audio device",
+    "capture_dropped_frames_total": "Frames lost because the capture buffer was full",
+    "startup_import_seconds": "Time to import the heavy modules at start-up",
+}
+
+
+def version():
+    """Version label: TRANSCRIBE_VERSION, else the git revision of this checkout"""
+    value = os.environ.get("TRANSCRIBE_VERSION")
+    if value:
+        return value
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+class Registry:
+    """Counters, gauges and histograms keyed by name and labels; thread-safe.
+
+    ``const_labels`` are added to every series; by default the version.
+    """
+
+    def __init__(self, const_labels=None):
+        self.const_labels = const_labels
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets),
+                                                     "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self):
+        """All series in the Prometheus text exposition format"""
+        if self.const_labels is None:
+            # Looked up on first use: it may run git
+            self.const_labels = {"version": version()}
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in series}):
+                    lines += _header(name, kind)
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{PREFIX}{name}{self._labels(labels)} {_number(value)}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines += _header(name, "histogram")
+                for (series_name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if series_name != name:
+                        continue
+                    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                        le = (("le", _number(bound)),)
+                        lines.append(f"{PREFIX}{name}_bucket{self._labels(labels + le)} {count}")
+                    lines.append(f"{PREFIX}{name}_bucket{self._labels(labels + (('le', '+Inf'),))} "
+                                 f"{histogram['count']}")
+                    lines.append(f"{PREFIX}{name}_sum{self._labels(labels)} {_number(histogram['sum'])}")
+                    lines.append(f"{PREFIX}{name}_count{self._labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def _labels(self, labels):
+        pairs = list(self.const_labels.items()) + list(labels)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _header(name, kind):
+    lines = [f"# HELP {PREFIX}{name} {HELP[name]}"] if name in HELP else []
+    return lines + [f"# TYPE {PREFIX}{name} {kind}"]
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def record_event(registry, event, record):
+    """Update the figures for one metrics log record"""
+    model = record.get("model")
+    if event == "transcription" and not record.get("warmup"):
+        audio_seconds = record.get("audio_seconds") or 0.0
+        registry.inc("clips_total", model=model)
+        registry.inc("audio_seconds_total", audio_seconds, model=model)
+        registry.inc("fallbacks_total", record.get("fallbacks") or 0, model=model)
+        registry.inc("aborts_total", record.get("aborts") or 0, model=model)
+        registry.observe("decode_seconds", record["seconds"], model=model)
+        if audio_seconds:
+            registry.observe("rtf", record["seconds"] / audio_seconds, RTF_BUCKETS, model=model)
+        if "scheduler_wait" in record:
+            registry.observe("scheduler_wait_seconds", record["scheduler_wait"])
+    elif event == "import":
+        registry.inc("imports_total", model=model)
+        registry.inc("import_audio_seconds_total", record.get("audio_seconds") or 0.0, model=model)
+    elif event == "job":
+        registry.inc("jobs_total", model=model)
+        registry.observe("job_queue_wait_seconds", record.get("queue_wait") or 0.0)
+    elif event == "model_load":
+        registry.inc("model_loads_total", model=model)
+        registry.observe("model_load_seconds", record["seconds"], model=model)
+    elif event == "capture":
+        registry.inc("capture_overflows_total", record.get("overflows") or 0)
+        registry.inc("capture_underruns_total", record.get("underruns") or 0)
+        registry.inc("capture_dropped_frames_total", record.get("dropped_frames") or 0)
+    elif event == "startup":
+        registry.set("startup_import_seconds", record["import_seconds"])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_file(path):
+    """Write the figures to path atomically, so a collector never reads half a file"""
+    partial = path + ".part"
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(partial, path)
+
+
+_started = False
+_start_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def start_exporter():
+    """Start the endpoint and/or file writer configured in the environment (once)"""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    port = os.environ.get("TRANSCRIBE_METRICS_PORT")
+    if port:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", int(port)), _Handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        except Exception as e:
+            print(f"Metrics endpoint error: {e}")
+    path = os.environ.get("TRANSCRIBE_METRICS_FILE")
+    if path:
+        interval = float(os.environ.get("TRANSCRIBE_METRICS_INTERVAL", "15"))
+
+        def write_periodically():
+            while not _stop.wait(interval):
+                _write_quietly(path)
+
+        threading.Thread(target=write_periodically, daemon=True).start()
+        atexit.register(_write_quietly, path)
+
+
+def disable_exporter():
+    """Keep this process from exporting, e.g. in worker processes that report to a parent"""
+    global _started
+    with _start_lock:
+        _started = True
+
+
+def _write_quietly(path):
+    try:
+        write_file(path)
+    except Exception as e:
+        print(f"Metrics file error: {e}")
+
+
+REGISTRY = Registry()
+
+
+def observe_event(event, record):
+    """Called for every metrics log record; never raises"""
+    try:
+        start_exporter()
+        record_event(REGISTRY, event, record)
+    except Exception as e:
+        print(f"Metrics export error: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the metrics log as Prometheus text")
+    parser.add_argument("-o", "--output", help="write to this file instead of standard output")
+    args = parser.parse_args(argv)
+
+    from metrics_log import read_metrics
+
+    disable_exporter()
+    for record in read_metrics():
+        try:
+            record_event(REGISTRY, record.get("event"), record)
+        except (KeyError, TypeError, ZeroDivisionError):
+            continue
+    if args.output:
+        write_file(args.output)
+    else:
+        sys.stdout.write(REGISTRY.render())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
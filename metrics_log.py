@@ -0,0 +1,44 @@
+import json
+import os
+import threading
+import time
+
+from app_paths import data_dir
+from metrics_export import observe_event
+
+_write_lock = threading.Lock()
+
+
+def metrics_log_path():
+    """Location of the JSON-lines metrics log"""
+    return os.environ.get("TRANSCRIBE_METRICS_LOG",
+                          os.path.join(data_dir(), "metrics.jsonl"))
+
+
+def log_metrics(event, **fields):
+    """Append one metrics record to the log and the exported figures; never raises"""
+    record = {"time": time.time(), "event": event}
+    record.update(fields)
+    try:
+        with _write_lock:
+            with open(metrics_log_path(), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"Metrics log error: {e}")
+    observe_event(event, record)
+
+
+def read_metrics(event=None):
+    """Yield records from the metrics log, optionally filtered by event name"""
+    try:
+        f = open(metrics_log_path(), encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if event is None or record.get("event") == event:
+                yield record
@@ -0,0 +1,109 @@
+"""Automatic model choice from measured decoding speed.
+
+Whisper decodes audio in 30 s windows and pads shorter clips to a full
+window, so a model's speed on this machine is kept as seconds per window.
+It is learned from the transcription and import records in the metrics
+log, including the warm-up run after a model loads.  ``choose`` picks the
+most accurate model predicted to finish a clip, plus the clips queued
+ahead of it, within the latency target.
+"""
+import collections
+import math
+import os
+import statistics
+
+import numpy as np
+
+from metrics_log import read_metrics
+
+WINDOW_SECONDS = 30.0
+
+# Relative decoding cost, used to estimate models that have not been measured
+# yet from the ones that have; roughly proportional to parameter count
+RELATIVE_COST = {"tiny": 1.0, "base": 1.9, "small": 6.0, "turbo": 8.0, "medium": 18.0, "large": 36.0}
+ACCURACY_ORDER = ["tiny", "base", "small", "medium", "turbo", "large"]
+
+
+def model_family(name):
+    """'large-v3' -> 'large', 'base.en' -> 'base'"""
+    return name.split(".")[0].split("-")[0]
+
+
+def windows(audio_seconds):
+    return max(1, math.ceil(audio_seconds / WINDOW_SECONDS))
+
+
+def synthetic_speech(seconds, sample_rate=16000, seed=0):
+    """Voiced-sounding test signal: harmonic tones in syllable-rate bursts"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (rng.random(len(t)) > 0.0005)
+    return (0.1 * voice * envelope + 0.005 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+class ModelSelector:
+    """Picks a model per clip from measured speed and a latency target (seconds)"""
+
+    def __init__(self, candidates, latency_target=None, history=20):
+        self.candidates = sorted(candidates, key=lambda name: ACCURACY_ORDER.index(model_family(name)))
+        if latency_target is None:
+            latency_target = float(os.environ.get("TRANSCRIBE_LATENCY_TARGET", "5"))
+        self.latency_target = latency_target
+        self._window_seconds = collections.defaultdict(lambda: collections.deque(maxlen=history))
+        for record in read_metrics():
+            # Load-test runs share the CPU between clips, so they are not representative
+            if record["event"] in ("transcription", "import") and not record.get("load_test"):
+                self.observe(record)
+
+    def observe(self, record):
+        """Learn from a transcription metrics record (model, audio_seconds, seconds)"""
+        name = record.get("model")
+        audio_seconds = record.get("audio_seconds")
+        if name and audio_seconds and record.get("seconds"):
+            self._window_seconds[name].append(record["seconds"] / windows(audio_seconds))
+
+    def measurements(self, name):
+        return len(self._window_seconds.get(name, ()))
+
+    def seconds_per_window(self, name):
+        """Median measured seconds per window, else an estimate from other models (or None)"""
+        samples = self._window_seconds.get(name)
+        if samples:
+            return statistics.median(samples)
+        cost = RELATIVE_COST[model_family(name)]
+        estimates = [statistics.median(samples) * cost / RELATIVE_COST[model_family(other)]
+                     for other, samples in self._window_seconds.items()
+                     if samples and model_family(other) in RELATIVE_COST]
+        return statistics.median(estimates) if estimates else None
+
+    def predict(self, name, audio_seconds):
+        """Predicted decoding seconds for a clip, or None if nothing has been measured"""
+        per_window = self.seconds_per_window(name)
+        return None if per_window is None else per_window * windows(audio_seconds)
+
+    def choose(self, audio_seconds, backlog=()):
+        """Most accurate candidate predicted to finish within the target.
+
+        ``backlog`` lists the durations of clips queued ahead of this one; they
+        are decoded first, so they eat into the same budget.  When no
+        candidate fits (or nothing is measured yet) the smallest is used.
+        """
+        best = self.candidates[0]
+        for name in self.candidates:
+            predicted = self.predict(name, audio_seconds)
+            if predicted is None:
+                continue
+            predicted += sum(self.predict(name, seconds) for seconds in backlog)
+            if predicted <= self.latency_target:
+                best = name
+        return best
+
+    def warm_up(self, engine, seconds=5.0):
+        """Time a short synthetic clip so a freshly loaded model has a measurement"""
+        builder = engine.new_feature_builder()
+        builder.feed(synthetic_speech(seconds))
+        result = engine.transcribe_mel(builder.result(), metrics={"warmup": True})
+        self.observe(result["metrics"])
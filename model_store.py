@@ -0,0 +1,261 @@
+"""Local Whisper model store.
+
+Models are fetched once with ``python model_store.py prefetch <name>...``: the
+download is checked against the SHA-256 published in whisper's model URL,
+converted to an FP32 checkpoint that can be memory-mapped, and recorded in a
+manifest.  After that, loads are offline and only compare file size and mtime
+with the manifest instead of re-hashing gigabytes on every start.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import torch
+import whisper
+from whisper.model import AudioEncoder, ModelDimensions, TextDecoder, Whisper
+
+from app_paths import data_dir
+from memory_usage import as_mib, current_rss
+from metrics_log import log_metrics
+
+MANIFEST_NAME = "manifest.json"
+
+
+def model_dir():
+    """Directory holding the converted checkpoints and the manifest"""
+    path = os.environ.get("TRANSCRIBE_MODEL_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        return path
+    return data_dir("models")
+
+
+def available_models():
+    """Model names whisper knows how to download"""
+    return list(whisper._MODELS)
+
+
+def read_manifest(root=None):
+    """Return the manifest dict (empty if the store is new)"""
+    try:
+        with open(os.path.join(root or model_dir(), MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(manifest, root):
+    """Atomically replace the manifest"""
+    path = os.path.join(root, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _sha256(path):
+    """Hash a file in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_prefetched(name, root=None):
+    """True when the manifest entry still matches the file on disk"""
+    root = root or model_dir()
+    entry = read_manifest(root).get(name)
+    if not entry:
+        return False
+    try:
+        st = os.stat(os.path.join(root, entry["file"]))
+    except FileNotFoundError:
+        return False
+    return st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]
+
+
+def _download(url, path, expected_sha256, progress=None):
+    """Stream url to path, hashing on the fly; raises if the checksum differs"""
+    digest = hashlib.sha256()
+    with urllib.request.urlopen(url) as source, open(path + ".part", "wb") as output:
+        total = int(source.info().get("Content-Length", 0))
+        done = 0
+        for block in iter(lambda: source.read(1 << 20), b""):
+            output.write(block)
+            digest.update(block)
+            done += len(block)
+            if progress:
+                progress(done, total)
+    if digest.hexdigest() != expected_sha256:
+        os.unlink(path + ".part")
+        raise RuntimeError(f"Checksum mismatch downloading {url}")
+    os.replace(path + ".part", path)
+
+
+def prefetch(name, root=None, progress=None, force=False):
+    """Download, verify and convert a model once; returns the stored checkpoint path"""
+    if name not in whisper._MODELS:
+        raise ValueError(f"Unknown model '{name}'; available: {', '.join(available_models())}")
+    root = root or model_dir()
+    if is_prefetched(name, root) and not force:
+        return os.path.join(root, read_manifest(root)[name]["file"])
+
+    url = whisper._MODELS[name]
+    expected_sha256 = url.split("/")[-2]
+    download_path = os.path.join(root, os.path.basename(url))
+    if not os.path.isfile(download_path) or _sha256(download_path) != expected_sha256:
+        _download(url, download_path, expected_sha256, progress)
+
+    # Released checkpoints are FP16; store FP32 so loads can map the weights
+    # directly instead of copying them into freshly allocated parameters
+    checkpoint = torch.load(download_path, map_location="cpu", weights_only=True)
+    state = {key: value.float() if value.is_floating_point() else value
+             for key, value in checkpoint["model_state_dict"].items()}
+    stored_name = f"{name}.fp32.pt"
+    stored_path = os.path.join(root, stored_name)
+    torch.save({"dims": checkpoint["dims"], "model_state_dict": state}, stored_path + ".tmp")
+    os.replace(stored_path + ".tmp", stored_path)
+    del checkpoint, state
+    os.unlink(download_path)
+
+    st = os.stat(stored_path)
+    manifest = read_manifest(root)
+    manifest[name] = {
+        "file": stored_name,
+        "source_url": url,
+        "source_sha256": expected_sha256,
+        "sha256": _sha256(stored_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "alignment_heads": whisper._ALIGNMENT_HEADS[name].decode("ascii"),
+        "prefetched_at": time.time(),
+    }
+    _write_manifest(manifest, root)
+    return stored_path
+
+
+def ensure_prefetched(name, root=None, allow_download=None):
+    """Prefetch a model that is not in the store if downloads are allowed, else raise.
+
+    Downloads are allowed with ``allow_download=True`` or, when it is None,
+    ``TRANSCRIBE_ALLOW_DOWNLOAD=1``.  Callers that start several loaders
+    call this once first, so they do not all download the same model.
+    """
+    root = root or model_dir()
+    if allow_download is None:
+        allow_download = os.environ.get("TRANSCRIBE_ALLOW_DOWNLOAD") == "1"
+    if not is_prefetched(name, root):
+        if not allow_download:
+            raise FileNotFoundError(
+                f"Model '{name}' is not in {root}; run: python model_store.py prefetch {name}")
+        prefetch(name, root)
+
+
+def verify(name, root=None):
+    """Re-hash a stored model against the checksum recorded at prefetch time"""
+    root = root or model_dir()
+    entry = read_manifest(root).get(name)
+    if not entry:
+        return False
+    return _sha256(os.path.join(root, entry["file"])) == entry["sha256"]
+
+
+def _new_model(dims):
+    """Build an empty Whisper module, on the meta device when possible.
+
+    Whisper.__init__ itself cannot run on the meta device (its alignment-head
+    buffer is made sparse), so only the encoder and decoder are built there.
+    """
+    try:
+        model = Whisper.__new__(Whisper)
+        torch.nn.Module.__init__(model)
+        model.dims = dims
+        with torch.device("meta"):
+            model.encoder = AudioEncoder(dims.n_mels, dims.n_audio_ctx, dims.n_audio_state,
+                                         dims.n_audio_head, dims.n_audio_layer)
+            model.decoder = TextDecoder(dims.n_vocab, dims.n_text_ctx, dims.n_text_state,
+                                        dims.n_text_head, dims.n_text_layer)
+        return model, True
+    except Exception:
+        return Whisper(dims), False
+
+
+def load_model(name, device=None, root=None, allow_download=None):
+    """Load a model from the store with memory-mapped weights, without network access.
+
+    A model that was not prefetched is an error, unless downloads are
+    allowed (``allow_download=True`` or ``TRANSCRIBE_ALLOW_DOWNLOAD=1``), in
+    which case it is prefetched first.  Load time and
+    RSS before and after are logged as a ``model_load`` metrics record; as
+    the weights are mapped, most of them only become resident during the
+    first transcription.
+    """
+    root = root or model_dir()
+    ensure_prefetched(name, root, allow_download)
+
+    entry = read_manifest(root)[name]
+    start_time = time.perf_counter()
+    rss_before = current_rss()
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    checkpoint = torch.load(os.path.join(root, entry["file"]), map_location="cpu",
+                            mmap=True, weights_only=True)
+    dims = ModelDimensions(**checkpoint["dims"])
+    model, on_meta = _new_model(dims)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+    if on_meta:
+        # Non-persistent buffers are not part of the checkpoint
+        n_ctx = dims.n_text_ctx
+        mask = torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1)
+        model.decoder.register_buffer("mask", mask, persistent=False)
+    model.set_alignment_heads(entry["alignment_heads"].encode("ascii"))
+    if any(tensor.is_meta for tensor in model.buffers()):
+        raise RuntimeError(f"Model '{name}' has uninitialized buffers after loading")
+    model = model.to(device)
+    log_metrics("model_load", model=name, device=str(device), seconds=time.perf_counter() - start_time,
+                rss_before_mb=as_mib(rss_before), rss_after_mb=as_mib(current_rss()),
+                file_mb=as_mib(entry["size"]))
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the local Whisper model store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    prefetch_parser = sub.add_parser("prefetch", help="download, verify and convert models")
+    prefetch_parser.add_argument("models", nargs="+", choices=available_models())
+    prefetch_parser.add_argument("--force", action="store_true",
+                                 help="download again even if the model is stored")
+    verify_parser = sub.add_parser("verify", help="re-hash stored models")
+    verify_parser.add_argument("models", nargs="*")
+    sub.add_parser("list", help="show stored models")
+    args = parser.parse_args(argv)
+
+    if args.command == "prefetch":
+        def progress(done, total):
+            if total:
+                print(f"\r  {done * 100 // total:3d}%", end="", flush=True)
+
+        for name in args.models:
+            print(f"Prefetching {name}...")
+            path = prefetch(name, progress=progress, force=args.force)
+            print(f"\r  stored {path}")
+    elif args.command == "verify":
+        names = args.models or list(read_manifest())
+        failed = [name for name in names if not verify(name)]
+        for name in names:
+            print(f"{name}: {'FAILED' if name in failed else 'ok'}")
+        return 1 if failed else 0
+    else:
+        for name, entry in sorted(read_manifest().items()):
+            print(f"{name}: {entry['file']} ({entry['size'] / 2**20:.0f} MiB) sha256={entry['sha256'][:12]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
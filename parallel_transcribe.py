@@ -0,0 +1,245 @@
+"""Transcribe one long recording on several processes at once.
+
+    python parallel_transcribe.py lecture.flac --model base --workers 8
+    python transcribe_file.py lecture.flac --model base --workers 8
+
+The file is cut into chunks of roughly ``--chunk-seconds`` at the quietest
+point near each boundary, so a cut rarely lands inside a word.  Each chunk,
+plus ``--overlap`` seconds of audio on either side, is transcribed as an
+independent clip by a pool of worker processes, each with its own copy of
+the model and an equal share of the CPU threads.  Results are stitched
+back in order as they arrive: segment times are shifted to the whole file,
+a segment belongs to the chunk holding its midpoint, and words repeated
+across a seam are dropped once.
+
+Each worker holds a model in memory; pick ``--workers`` with that in mind.
+Interrupted parallel runs start over (the sequential mode resumes).
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+import metrics_export
+from metrics_log import log_metrics
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+WORD_RE = re.compile(r"\w+(?:'\w+)*")
+
+
+def frame_levels(path, block_seconds=60.0):
+    """Loudness in dB of each 30 ms frame of a file, read in blocks"""
+    levels = []
+    with sf.SoundFile(path) as f:
+        frame = max(1, int(f.samplerate * FRAME_SECONDS))
+        block = frame * max(1, int(block_seconds / FRAME_SECONDS))
+        while True:
+            data = f.read(block, dtype="float32", always_2d=True)
+            count = len(data) // frame
+            if count:
+                frames = data[:count * frame].mean(axis=1).reshape(count, frame)
+                levels.append(10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10))
+            if len(data) < block:
+                break
+    return np.concatenate(levels) if levels else np.zeros(0)
+
+
+def plan_chunks(path, chunk_seconds=300.0, search_seconds=30.0, pause_seconds=0.5):
+    """(start, end) seconds of each chunk, cut in the quietest pause near every chunk_seconds"""
+    duration = sf.info(path).duration
+    if duration <= chunk_seconds + search_seconds:
+        return [(0.0, duration)]
+    search_seconds = min(search_seconds, chunk_seconds / 4)
+    levels = frame_levels(path)
+    # Average loudness of the pause_seconds around each frame
+    width = max(1, int(pause_seconds / FRAME_SECONDS))
+    quiet = np.convolve(levels, np.ones(width) / width, mode="same")
+    cuts = [0.0]
+    while duration - cuts[-1] > chunk_seconds + search_seconds:
+        low = int((cuts[-1] + chunk_seconds - search_seconds) / FRAME_SECONDS)
+        high = int((cuts[-1] + chunk_seconds + search_seconds) / FRAME_SECONDS)
+        # Among equally quiet pauses, the one nearest the target length
+        distance = np.abs(np.arange(low, high) - (low + high) / 2) * FRAME_SECONDS
+        cuts.append((low + int(np.argmin(quiet[low:high] + distance))) * FRAME_SECONDS)
+    cuts.append(duration)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def read_chunk(path, start, end):
+    """Mono 16 kHz samples of a file between two times"""
+    from audio_file import StreamingResampler
+
+    with sf.SoundFile(path) as f:
+        f.seek(int(start * f.samplerate))
+        data = f.read(int((end - start) * f.samplerate), dtype="float32", always_2d=True)
+        resampler = StreamingResampler(f.samplerate, SAMPLE_RATE)
+    return np.concatenate((resampler.process(data.mean(axis=1)), resampler.flush()))
+
+
+_engine = None
+
+
+def _init_worker(model_name, threads):
+    """Load the model once per worker process, on its share of the cores"""
+    global _engine
+    import torch
+    import model_store
+    from transcription_engine import TranscriptionEngine
+
+    torch.set_num_threads(threads)
+    # The parent exports the figures for the whole run
+    metrics_export.disable_exporter()
+    # The parent has prefetched the model, so workers never race to download it
+    _engine = TranscriptionEngine(model_store.load_model(model_name, allow_download=False), model_name)
+
+
+def _transcribe_chunk(path, index, start, end, decode_options):
+    """Worker side: transcribe [start, end) of the file; segment times are global"""
+    audio = read_chunk(path, start, end)
+    builder = _engine.new_feature_builder()
+    builder.feed(audio)
+    result = _engine.transcribe_mel(builder.result(), metrics={"chunk": index, "parallel": True},
+                                    **decode_options)
+    for segment in result["segments"]:
+        segment["start"] += start
+        segment["end"] += start
+        segment.pop("tokens", None)
+    return {"segments": result["segments"], "language": result["language"], "metrics": result["metrics"]}
+
+
+def _words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def dedupe_seam(previous_text, text, max_words=8):
+    """Drop the words at the start of text that repeat the end of previous_text"""
+    before = _words(previous_text)[-max_words:]
+    after = _words(text)
+    for count in range(min(len(before), len(after), max_words), 0, -1):
+        if before[-count:] == after[:count]:
+            matches = list(WORD_RE.finditer(text))
+            return text[matches[count - 1].end():].lstrip(" ,.;:!?")
+    return text
+
+
+class Stitcher:
+    """Joins chunk results in order into one list of segments"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.segments = []
+        self._tail = ""
+
+    def add(self, index, segments):
+        """Add the segments of chunk index (the previous chunks must be added already); returns the kept ones"""
+        start, end = self.chunks[index]
+        last = index == len(self.chunks) - 1
+        kept = []
+        for segment in segments:
+            middle = (segment["start"] + segment["end"]) / 2
+            if not segment["text"].strip() or middle < start or middle >= end and not last:
+                continue
+            segment = dict(segment)
+            if not kept:
+                text = dedupe_seam(self._tail, segment["text"])
+                if not text:
+                    continue
+                segment["text"] = text if text.startswith(" ") else " " + text
+            segment["id"] = len(self.segments) + len(kept)
+            kept.append(segment)
+        if kept:
+            self._tail = kept[-1]["text"]
+        self.segments.extend(kept)
+        return kept
+
+
+def transcribe_parallel(path, model_name, output=None, workers=None, chunk_seconds=None,
+                        overlap=1.0, show_progress=True, **decode_options):
+    """Transcribe one file on a pool of processes; returns (segments, metrics record).
+
+    With ``output``, text is written there as each chunk is stitched on.
+    """
+    import model_store
+
+    workers = workers or os.cpu_count() or 1
+    name = os.path.basename(path)
+    model_store.ensure_prefetched(model_name)
+    start_time = time.perf_counter()
+    duration = sf.info(path).duration
+    if chunk_seconds is None:
+        # A few chunks per worker keep them all busy to the end
+        chunk_seconds = min(600.0, max(60.0, duration / (workers * 3)))
+    chunks = plan_chunks(path, chunk_seconds)
+    workers = min(workers, len(chunks))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    stitcher = Stitcher(chunks)
+    decode_seconds = 0.0
+    fallbacks = aborts = 0
+    out = open(output, "w", encoding="utf-8") if output else None
+    # Worker processes are started fresh: forking a process with torch threads running can hang
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(model_name, threads)) as pool:
+            futures = [pool.submit(_transcribe_chunk, path, index, max(0.0, start - overlap),
+                                   min(duration, end + overlap), decode_options)
+                       for index, (start, end) in enumerate(chunks)]
+            for index, future in enumerate(futures):
+                result = future.result()
+                kept = stitcher.add(index, result["segments"])
+                metrics_export.observe_event("transcription", result["metrics"])
+                decode_seconds += result["metrics"]["seconds"]
+                fallbacks += result["metrics"]["fallbacks"]
+                aborts += result["metrics"]["aborts"]
+                if out:
+                    text = "".join(segment["text"] for segment in kept)
+                    out.write(text.lstrip() if out.tell() == 0 else text)
+                    out.flush()
+                if show_progress:
+                    print(f"\r{name}: {(index + 1) * 100 / len(chunks):3.0f}%", end="", file=sys.stderr, flush=True)
+        if out:
+            out.write("\n")
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start_time
+    if show_progress:
+        print(f"\r{name}: {duration:.0f}s of audio in {elapsed:.1f}s on {workers} processes"
+              + (f" -> {output}" if output else ""), file=sys.stderr)
+    record = dict(file=name, model=model_name, audio_seconds=duration, seconds=elapsed,
+                  workers=workers, chunks=len(chunks), decode_seconds=decode_seconds,
+                  fallbacks=fallbacks, aborts=aborts)
+    log_metrics("import", **record)
+    return stitcher.segments, record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe a long recording on several processes")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("-m", "--model", default="base")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument("--chunk-seconds", type=float, help="target chunk length (default: from the file length)")
+    parser.add_argument("--overlap", type=float, default=1.0, help="seconds of audio shared by neighbouring chunks")
+    parser.add_argument("--language", help="spoken language (detected per chunk when omitted)")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for path in args.files:
+        try:
+            transcribe_parallel(path, args.model, os.path.splitext(path)[0] + ".txt", args.workers,
+                                args.chunk_seconds, args.overlap, language=args.language, task="transcribe")
+        except Exception as e:
+            print(f"\n{path}: {e}", file=sys.stderr)
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Compressed archive of recorded audio, written while recording.
+
+    TRANSCRIBE_ARCHIVE_DIR=~/recordings python speech_transcription_alt.py
+    TRANSCRIBE_ARCHIVE_DIR=~/recordings TRANSCRIBE_ARCHIVE_FORMAT=opus python speech_transcription.py
+    python session_archive.py ~/recordings        # sizes against 16-bit WAV
+
+With ``TRANSCRIBE_ARCHIVE_DIR`` set, every recording is kept there as
+``recording-<time>.flac`` (lossless, roughly 1.5-2x smaller than a WAV
+of speech) or, with ``TRANSCRIBE_ARCHIVE_FORMAT=opus``, ``.opus`` (Ogg Opus,
+about a tenth; ``wav`` keeps plain PCM).  Blocks are encoded by a writer
+thread as they are captured, so nothing is held back until the end and a
+crash loses at most the last few blocks.  Archived files are read back
+block by block like any other import: ``transcribe_file.py``, Import Audio
+and the watch folder all accept them.
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+# format name: (extension, soundfile format, subtype)
+FORMATS = {
+    "flac": (".flac", "FLAC", "PCM_16"),
+    "opus": (".opus", "OGG", "OPUS"),
+    "wav": (".wav", "WAV", "PCM_16"),
+}
+
+
+def archive_dir():
+    """Folder for archived recordings, or None when archiving is off"""
+    path = os.environ.get("TRANSCRIBE_ARCHIVE_DIR")
+    if not path:
+        return None
+    path = os.path.expanduser(path)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def archive_format():
+    name = os.environ.get("TRANSCRIBE_ARCHIVE_FORMAT", "flac").lower()
+    if name not in FORMATS:
+        raise ValueError(f"Unknown archive format '{name}' (use {', '.join(FORMATS)})")
+    return name
+
+
+class SessionArchive:
+    """Encodes one recording to a file on a writer thread as blocks arrive"""
+
+    def __init__(self, directory, sample_rate, channels=1, format=None, prefix="recording"):
+        import soundfile as sf
+
+        self.format = format or archive_format()
+        extension, self._major, self._subtype = FORMATS[self.format]
+        name = datetime.now().strftime(f"{prefix}-%Y%m%d-%H%M%S")
+        self.path = os.path.join(directory, name + extension)
+        count = 1
+        while os.path.exists(self.path):
+            count += 1
+            self.path = os.path.join(directory, f"{name}-{count}{extension}")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames = 0
+        self.error = None
+        # Created here, so a bad folder or format fails when recording starts
+        self._file = sf.SoundFile(self.path, "w", sample_rate, channels, self._subtype, format=self._major)
+        self._blocks = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_environment(cls, sample_rate, channels=1):
+        """An archive for a new recording if TRANSCRIBE_ARCHIVE_DIR is set, else None"""
+        directory = archive_dir()
+        return cls(directory, sample_rate, channels) if directory else None
+
+    def write(self, frames):
+        """Queue frames x channels samples (float32 or int16); does not wait for the encoder"""
+        self._blocks.put(frames)
+
+    def close(self):
+        """Finish the file; returns its path"""
+        self._blocks.put(None)
+        self._thread.join()
+        if self.error:
+            print(f"Archive error: {self.path}: {self.error}")
+        return self.path
+
+    def _write(self):
+        try:
+            with self._file as f:
+                while True:
+                    frames = self._blocks.get()
+                    if frames is None:
+                        return
+                    f.write(frames.reshape(len(frames), self.channels))
+                    self.frames += len(frames)
+        except Exception as e:
+            self.error = e
+            # Keep draining so the capture side never blocks on a full queue
+            while self._blocks.get() is not None:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the size of archived recordings")
+    parser.add_argument("folder", nargs="?", help="archive folder (default: TRANSCRIBE_ARCHIVE_DIR)")
+    args = parser.parse_args(argv)
+
+    import soundfile as sf
+
+    folder = args.folder or archive_dir()
+    if not folder:
+        parser.error("no folder given and TRANSCRIBE_ARCHIVE_DIR is not set")
+    total = pcm = 0
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        try:
+            info = sf.info(path)
+        except Exception:
+            continue
+        size = os.path.getsize(path)
+        wav_size = info.frames * info.channels * 2
+        total += size
+        pcm += wav_size
+        print(f"{name}: {info.duration:.0f}s, {size / 2**20:.2f} MiB ({wav_size / max(size, 1):.1f}x smaller than WAV)")
+    if total:
+        print(f"total: {total / 2**20:.1f} MiB, {pcm / total:.1f}x smaller than WAV")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
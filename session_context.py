@@ -0,0 +1,105 @@
+"""Prompt context carried from one clip to the next.
+
+Consecutive dictations in a session usually continue the same topic, so
+the end of what was transcribed so far and a glossary of domain terms are
+given to Whisper as ``initial_prompt``.  Domain terms then decode right
+the first time more often, and fewer windows fail the compression-ratio
+and log-probability checks that trigger temperature-fallback re-decodes
+(counted as ``fallbacks`` in the transcription metrics).
+
+The glossary is a text file with one term per line (``#`` starts a
+comment), ``~/.speech_transcription/glossary.txt`` unless
+``TRANSCRIBE_GLOSSARY`` names another file.
+"""
+import os
+import threading
+
+from app_paths import data_dir
+
+
+def glossary_path():
+    """Location of the glossary file"""
+    return os.environ.get("TRANSCRIBE_GLOSSARY", os.path.join(data_dir(), "glossary.txt"))
+
+
+def load_glossary(path=None):
+    """Glossary terms, or an empty list if there is no glossary file"""
+    try:
+        with open(path or glossary_path(), encoding="utf-8") as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+    except FileNotFoundError:
+        return []
+    return [line for line in lines if line]
+
+
+class SessionContext:
+    """Transcript tail plus glossary, as a Whisper prompt.
+
+    The decoder keeps only the last ``max_tokens`` prompt tokens (223 for
+    all Whisper models), and every window of a longer clip appends its own
+    text behind the prompt, so tokens are always dropped from the front.
+    The glossary therefore comes last, right before the clip, and the
+    transcript tail in front of it gets the tokens that are left: it is
+    what goes first when the prompt has to shrink.
+    """
+
+    def __init__(self, glossary=None, max_chars=2000):
+        self.glossary = load_glossary() if glossary is None else list(glossary)
+        self.max_chars = max_chars  # transcript kept, well over what a prompt can hold
+        self._tail = ""
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        """Remember a clip's transcript as context for the next one"""
+        text = " ".join(text.split())
+        if not text:
+            return
+        with self._lock:
+            self._tail = f"{self._tail} {text}".strip()[-self.max_chars:]
+
+    def reset(self):
+        """Forget the transcript (the glossary stays)"""
+        with self._lock:
+            self._tail = ""
+
+    def prompt(self, count_tokens=None, max_tokens=223):
+        """The prompt for the next clip, at most max_tokens long, or None if there is no context yet.
+
+        ``count_tokens(text)`` should be the model's tokenizer
+        (``TranscriptionEngine.count_tokens``); without it, 4 characters
+        per token are assumed.
+        """
+        if count_tokens is None:
+            count_tokens = _estimate_tokens
+        # More glossary terms than fit: keep as many of the first ones as do
+        low, high = 0, len(self.glossary)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(_glossary_text(self.glossary[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        glossary = _glossary_text(self.glossary[:low])
+        with self._lock:
+            words = self._tail.split(" ") if self._tail else []
+        # Fewest leading words to drop so the tail and glossary fit together
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high) // 2
+            if count_tokens(_join(words[middle:], glossary)) <= max_tokens:
+                high = middle
+            else:
+                low = middle + 1
+        return _join(words[low:], glossary) or None
+
+
+def _glossary_text(terms):
+    return ", ".join(terms) + "." if terms else ""
+
+
+def _join(words, glossary):
+    return " ".join(part for part in (" ".join(words), glossary) if part)
+
+
+def _estimate_tokens(text):
+    return (len(text) + 3) // 4
@@ -1,24 +1,49 @@
+import argparse
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import threading
-import sounddevice as sd
-import soundfile as sf
-import whisper
-import tempfile
 import os
 import sys
 from datetime import datetime
 import queue
 import platform
-import numpy as np
-import ssl
-import urllib.request
+import time
 
-# Fix SSL certificate issues
-try:
-    ssl._create_default_https_context = ssl._create_unverified_context
-except:
-    pass
+from clip_recording import ClipRecording
+from decode_scheduler import DecodeScheduler
+from job_profiler import JobProfiler
+from session_archive import SessionArchive
+from metrics_log import log_metrics
+from metrics_export import REGISTRY as exported_metrics
+from session_context import SessionContext
+from transcript_history import TranscriptHistory, format_result
+from ui_updates import UIUpdates
+
+# numpy, the audio libraries and whisper/torch take seconds to import, so they
+# are imported on the model loading thread once the window is already up
+np = sd = sf = None
+model_store = CaptureRingBuffer = TranscriptionEngine = ContinuousDictation = ModelSelector = None
+PersistentInput = CaptureProcess = None
+
+def import_heavy_modules():
+    """Import the heavy dependencies into module globals; returns seconds taken"""
+    global np, sd, sf, model_store, CaptureRingBuffer, TranscriptionEngine, ContinuousDictation
+    global ModelSelector, PersistentInput, CaptureProcess
+    if ContinuousDictation is not None:
+        return 0.0
+    start_time = time.perf_counter()
+    import numpy as np
+    import fake_audio
+    sd = fake_audio.sounddevice_module()
+    import soundfile as sf
+    import model_store
+    from capture_buffer import CaptureRingBuffer
+    from input_stream import PersistentInput
+    from capture_process import CaptureProcess
+    from transcription_engine import TranscriptionEngine
+    from utterance_endpointing import ContinuousDictation
+    from model_selection import ModelSelector
+    return time.perf_counter() - start_time
 
 class WindowsSpeechTranscriptionTool:
     def __init__(self, root):
@@ -30,19 +55,65 @@ class WindowsSpeechTranscriptionTool:
         self.sample_rate = 16000
         self.channels = 1
         self.recording = False
-        self.audio_data = []
+        self.importing = False
+        self.capture_buffer = None
+        self.clip = None  # the recording in progress, a ClipRecording
+        # The input stream stays open between recordings and keeps a short pre-roll
+        self.input = None
+        self.push_to_talk_key = os.environ.get("TRANSCRIBE_PUSH_TO_TALK_KEY", "F8")
+        self.push_to_talk_active = False
+        self.push_to_talk_release = None
+        self.capture_buffer_seconds = 10
         
         # Use tiny model for speed
         self.whisper_model = None
+        self.engine = None
+        self.engines = {}
+        self.engine_lock = threading.Lock()
+        self.max_engines = 2  # loaded models kept for auto mode
+        # "auto" picks a model per clip to meet TRANSCRIBE_LATENCY_TARGET (seconds)
+        self.model_selector = None
+        self.typical_clip_seconds = 10
+        # Recorded clips are decoded before the windows of an import
+        self.scheduler = DecodeScheduler()
+        # TRANSCRIBE_PROFILE_JOBS, --profile or Control-Alt-P profile the next recordings
+        self.profiler = JobProfiler()
         self.model_loading = False
         
-        # Queue for thread communication
+        # Queue for thread communication, drained on the Tk thread by self.ui
         self.result_queue = queue.Queue()
         
-        # Processing timeout
-        self.processing_timeout = None
+        # Optimized transcription settings for speed
+        self.decode_options = {
+            "fp16": False,  # Use FP32 for CPU
+            "language": None,  # Auto-detect language
+            "task": "transcribe",
+        }
+        
+        # Each clip is prompted with the glossary and the end of the session's transcript
+        self.context = SessionContext()
+        self.use_context = True
+        
+        # Every transcribed segment is kept in a searchable history
+        self.history = TranscriptHistory()
+        
+        # Hands-free dictation: utterances are cut at pauses and queued
+        self.min_silence_seconds = 0.7
+        self.max_utterance_seconds = 20.0
+        self.dictation = None
+        self.utterance_queue = queue.Queue()
+        threading.Thread(target=self.transcription_worker, daemon=True).start()
+        # Stopped recordings are decoded in order while the next one records
+        self.clip_queue = queue.Queue()
+        threading.Thread(target=self.clip_worker, daemon=True).start()
         
         self.setup_ui()
+        self.ui = UIUpdates(self.root, self.result_queue, self.status_label,
+                            self.append_transcription)
+        self.ui.start()
+        self.root.bind_all("<Control-Alt-p>", self.arm_profiler)
+        self.root.bind_all(f"<KeyPress-{self.push_to_talk_key}>", self.on_push_to_talk_press)
+        self.root.bind_all(f"<KeyRelease-{self.push_to_talk_key}>", self.on_push_to_talk_release)
         self.load_whisper_model()
         
     def setup_ui(self):
@@ -80,13 +151,24 @@ class WindowsSpeechTranscriptionTool:
         
         # Model selection
         ttk.Label(controls_frame, text="Model:").grid(row=0, column=2, padx=(20, 5))
+        self.model_names = ["tiny", "base"]
         self.model_var = tk.StringVar(value="tiny")
         model_combo = ttk.Combobox(controls_frame, textvariable=self.model_var, 
-                                  values=["tiny", "base"],
+                                  values=self.model_names + ["auto"],
                                   state="readonly", width=10)
         model_combo.grid(row=0, column=3, padx=(0, 10))
         model_combo.bind("<<ComboboxSelected>>", self.on_model_change)
         
+        # Hands-free mode keeps the stream open and transcribes at each pause
+        self.continuous_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls_frame, text="Hands-free", 
+                       variable=self.continuous_var).grid(row=0, column=4, padx=(0, 10))
+        
+        # Carry context from one clip to the next (see session_context.py)
+        self.context_var = tk.BooleanVar(value=self.use_context)
+        ttk.Checkbutton(controls_frame, text="Use context", variable=self.context_var,
+                       command=self.on_context_change).grid(row=0, column=5, padx=(0, 10))
+        
         # Transcription area
         transcription_frame = ttk.LabelFrame(main_frame, text="Transcription", padding="10")
         transcription_frame.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
@@ -104,25 +186,52 @@ class WindowsSpeechTranscriptionTool:
         ttk.Button(action_frame, text="Clear", command=self.clear_text).grid(row=0, column=0, padx=(0, 10))
         ttk.Button(action_frame, text="Copy to Clipboard", command=self.copy_to_clipboard).grid(row=0, column=1, padx=(0, 10))
         ttk.Button(action_frame, text="Save to File", command=self.save_to_file).grid(row=0, column=2, padx=(0, 10))
+        ttk.Button(action_frame, text="Import Audio", command=self.import_audio).grid(row=0, column=3, padx=(0, 10))
+        ttk.Button(action_frame, text="Search History", command=self.search_history).grid(row=0, column=4, padx=(0, 10))
         
     def load_whisper_model(self):
         """Load Whisper model in a separate thread"""
         def load_model():
             try:
-                self.model_loading = True
-                self.status_label.config(text="Loading Whisper model...", foreground="orange")
+                self.ui.status("Loading Whisper model...", "orange")
+                import_seconds = import_heavy_modules()
+                if import_seconds:
+                    log_metrics("startup", import_seconds=import_seconds)
                 
                 model_name = self.model_var.get()
-                self.whisper_model = whisper.load_model(model_name)
-                self.status_label.config(text=f"Model loaded ({model_name}) - Ready to record", foreground="green")
+                # Offline, memory-mapped load from the local model store
+                self.model_selector = None
+                if model_name == "auto":
+                    # Start with the model expected to meet the latency target for a typical clip;
+                    # only prefetched models are candidates, so a clip never waits for a download
+                    stored = [name for name in self.model_names if model_store.is_prefetched(name)]
+                    if not stored:
+                        raise FileNotFoundError("No models prefetched; run: python model_store.py prefetch tiny base")
+                    self.model_selector = ModelSelector(stored)
+                    model_name = self.model_selector.choose(self.typical_clip_seconds)
+                self.engines = {}
+                self.engine = self.load_engine(model_name, startup=True)
+                self.whisper_model = self.engine.model
+                try:
+                    # Opened now so that starting to record is instant
+                    self.open_input()
+                except Exception as e:
+                    # Reported again when recording is started
+                    print(f"Could not open the input stream: {e}")
+                self.ui.status(f"Model loaded ({model_name}) - Ready to record", "green")
                 self.model_loading = False
             except Exception as e:
                 error_msg = f"Error loading model: {str(e)}"
-                self.status_label.config(text=error_msg, foreground="red")
+                self.ui.status(error_msg, "red")
                 self.model_loading = False
                 
+        self.model_loading = True
         threading.Thread(target=load_model, daemon=True).start()
         
+    def on_context_change(self):
+        """Mirror the checkbox in a plain attribute that worker threads can read"""
+        self.use_context = self.context_var.get()
+
     def on_model_change(self, event=None):
         """Handle model selection change"""
         if not self.model_loading and not self.recording:
@@ -146,35 +255,133 @@ class WindowsSpeechTranscriptionTool:
     def start_recording(self):
         """Start audio recording"""
         try:
+            clip = self.new_clip_recording()
+            self.open_input()
+            self.input.start(clip.capture_buffer)
+            self.clip = clip
+            self.capture_buffer = clip.capture_buffer
+            self.dictation = clip.dictation
             self.recording = True
-            self.audio_data = []
             self.record_btn.config(text="Stop Recording")
-            self.status_label.config(text="Recording... Click 'Stop Recording' when finished", 
-                                   foreground="red")
+            if self.dictation is not None:
+                self.status_label.config(text="Listening... Pause between sentences", 
+                                       foreground="red")
+            else:
+                self.status_label.config(text="Recording... Click 'Stop Recording' when finished", 
+                                       foreground="red")
             
             # Start recording in a separate thread
-            self.recording_thread = threading.Thread(target=self.record_audio, daemon=True)
-            self.recording_thread.start()
+            clip.thread = threading.Thread(target=self.record_audio, args=(clip,), daemon=True)
+            clip.thread.start()
+            self.root.after(500, self.update_capture_status, clip)
             
         except Exception as e:
             messagebox.showerror("Recording Error", f"Could not start recording: {str(e)}")
             
-    def record_audio(self):
-        """Record audio data using sounddevice"""
+    def open_input_stream(self, on_frames):
+        """Open the sounddevice stream that stays open between recordings"""
+        if os.environ.get("TRANSCRIBE_CAPTURE_PROCESS") == "1":
+            # The stream runs in its own process and hands frames over in shared memory
+            return CaptureProcess(on_frames, "sounddevice", self.sample_rate, self.channels, np.float32)
+        # The callback only copies frames into the ring buffer and never
+        # waits on the consumer
+        def callback(indata, frames, time, status):
+            on_frames(indata, status.input_overflow, status.input_underflow)
+
+        stream = sd.InputStream(callback=callback, channels=self.channels,
+                                samplerate=self.sample_rate, dtype=np.float32)
+        stream.start()
+        return stream
+
+    def record_audio(self, clip):
+        """Move captured audio to the clip or dictation until recording stops"""
         try:
-            def callback(indata, frames, time, status):
-                if self.recording:
-                    self.audio_data.append(indata.copy())
-            
-            with sd.InputStream(callback=callback, channels=self.channels, 
-                              samplerate=self.sample_rate, dtype=np.float32):
-                while self.recording:
-                    sd.sleep(100)  # Sleep for 100ms
-                    
+            # Wakes at once when recording stops
+            while not clip.stop_event.wait(0.1):
+                self.drain_capture_buffer(clip)
         except Exception as e:
             print(f"Recording error: {e}")
-            self.root.after(0, lambda: self.status_label.config(
-                text=f"Recording error: {str(e)}", foreground="red"))
+            error_msg = f"Recording error: {str(e)}"
+            self.ui.status(error_msg, "red")
+        finally:
+            # The last block may still be on its way
+            if clip.released is not None:
+                clip.released.wait(0.5)
+            self.drain_capture_buffer(clip)
+            if clip.dictation is not None:
+                clip.dictation.flush()
+            if clip.archive is not None:
+                clip.archive.close()
+            log_metrics("capture", sample_rate=self.sample_rate, **clip.capture_buffer.stats())
+                
+    def open_input(self):
+        """Open the persistent input stream if it is not open yet"""
+        if self.input is None:
+            self.input = PersistentInput(self.open_input_stream, self.sample_rate, self.channels,
+                                         np.float32)
+        self.input.open()
+
+    def on_push_to_talk_press(self, event=None):
+        """Push-to-talk: record while the key is held down"""
+        if self.push_to_talk_release is not None:
+            # Auto-repeat sends release/press pairs while the key is held
+            self.root.after_cancel(self.push_to_talk_release)
+            self.push_to_talk_release = None
+            return
+        if not self.recording and not self.push_to_talk_active:
+            self.toggle_recording()
+            self.push_to_talk_active = self.recording
+
+    def on_push_to_talk_release(self, event=None):
+        if self.push_to_talk_active:
+            self.push_to_talk_release = self.root.after(50, self.end_push_to_talk)
+
+    def end_push_to_talk(self):
+        self.push_to_talk_release = None
+        self.push_to_talk_active = False
+        if self.recording:
+            self.stop_recording()
+
+    def new_clip_recording(self):
+        """Set up the buffers and the consumer for a new recording"""
+        capture_buffer = CaptureRingBuffer(
+            self.sample_rate * self.capture_buffer_seconds, self.channels)
+        archive = SessionArchive.from_environment(self.sample_rate, self.channels)
+        if self.continuous_var.get():
+            dictation = ContinuousDictation(
+                self.engine, self.utterance_queue.put, self.sample_rate,
+                min_silence=self.min_silence_seconds,
+                max_utterance=self.max_utterance_seconds)
+            return ClipRecording(capture_buffer, dictation=dictation, archive=archive)
+        # Mel frames are computed while recording so stopping only leaves decoding
+        return ClipRecording(capture_buffer, self.engine.new_feature_builder(), archive=archive)
+            
+    def drain_capture_buffer(self, clip):
+        """Move pending frames from the clip's ring buffer into the clip (and the archive)"""
+        data = clip.capture_buffer.read()
+        if data is not None and clip.archive is not None:
+            clip.archive.write(data)
+        if data is not None and clip.dictation is not None:
+            clip.dictation.feed(data[:, 0])
+        elif data is not None:
+            clip.audio_data.append(data)
+            clip.audio_peak = max(clip.audio_peak, float(np.max(np.abs(data))))
+            clip.mel_builder.feed(data[:, 0])
+            
+    def update_capture_status(self, clip):
+        """Show dropped audio in the status bar while recording"""
+        if clip is not self.clip:
+            return
+        summary = clip.capture_buffer.drop_summary()
+        if clip.dictation is not None:
+            status = (f"Listening... {clip.dictation.utterances} utterances, "
+                      f"{self.utterance_queue.qsize()} waiting")
+            if summary:
+                status += f" ({summary})"
+            self.status_label.config(text=status, foreground="red")
+        elif summary:
+            self.status_label.config(text=f"Recording... ({summary})", foreground="red")
+        self.root.after(500, self.update_capture_status, clip)
                 
     def stop_recording(self):
         """Stop recording and transcribe"""
@@ -182,77 +389,146 @@ class WindowsSpeechTranscriptionTool:
             return
             
         self.recording = False
+        clip, self.clip = self.clip, None
+        # The capture thread finishes once the input has moved off the clip's buffer
+        clip.stop(self.input.stop(timeout=0))
         self.record_btn.config(text="Start Recording")
+        if clip.dictation is not None:
+            # The capture thread flushes the last utterance into the queue
+            self.status_label.config(text="Hands-free stopped - Ready to record", foreground="green")
+            return
+            
         self.status_label.config(text="Processing audio...", foreground="orange")
         
-        # Set a shorter timeout for faster processing
-        self.processing_timeout = self.root.after(15000, self.handle_processing_timeout)  # 15 seconds
+        # Set a shorter timeout for faster processing of this recording
+        clip.timeout = self.root.after(15000, self.handle_processing_timeout, clip)  # 15 seconds
         
-        # Start transcription in a separate thread
-        threading.Thread(target=self.transcribe_audio, daemon=True).start()
+        # Decoded after any earlier recordings; the next one can start right away
+        self.clip_queue.put(clip)
+        exported_metrics.set("queue_depth", self.clip_queue.qsize(), queue="recordings")
         
-    def transcribe_audio(self):
+    def clip_worker(self):
+        """Transcribe stopped recordings one at a time, in the order they were stopped"""
+        while True:
+            clip = self.clip_queue.get()
+            exported_metrics.set("queue_depth", self.clip_queue.qsize(), queue="recordings")
+            self.transcribe_audio(clip)
+            self.ui.call(self.cancel_processing_timeout, clip)
+
+    def transcribe_audio(self, clip):
         """Transcribe the recorded audio with optimizations"""
-        if not self.audio_data:
-            self.root.after(0, lambda: self.status_label.config(
-                text="No audio recorded - Please try again", foreground="red"))
+        # Wait for the capture thread to hand over its last frames
+        clip.wait_until_captured()
+        mel = clip.mel_builder.result()
+        
+        if not clip.audio_data:
+            self.ui.status("No audio recorded - Please try again", "red")
             return
             
         try:
-            # Combine all audio data
-            audio_array = np.concatenate(self.audio_data, axis=0)
-            
             # Check if audio has any content
-            if np.max(np.abs(audio_array)) < 0.01:
-                self.root.after(0, lambda: self.status_label.config(
-                    text="Audio too quiet - Please speak louder", foreground="red"))
+            if clip.audio_peak < 0.01:
+                self.ui.status("Audio too quiet - Please speak louder", "red")
                 return
             
-            # Save audio to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-                sf.write(temp_file.name, audio_array, self.sample_rate)
-                
-                # Transcribe using Whisper with optimized settings
-                if self.whisper_model is None:
-                    self.root.after(0, lambda: self.status_label.config(
-                        text="Whisper model not loaded", foreground="red"))
-                    return
-                    
-                # Use optimized transcription settings for speed
-                result = self.whisper_model.transcribe(
-                    temp_file.name,
-                    fp16=False,  # Use FP32 for CPU
-                    language=None,  # Auto-detect language
-                    task="transcribe"
-                )
-                transcription = result["text"].strip()
-                
-                # Update UI in main thread
-                self.root.after(0, self.update_transcription, transcription)
-                
-                # Clean up temporary file
-                os.unlink(temp_file.name)
+            # Transcribe the features computed during recording
+            with self.profiler.job("recording", lambda: np.concatenate(clip.audio_data), self.sample_rate):
+                result = self.transcribe_clip(
+                    mel, capture_buffer_mb=round(clip.capture_buffer.nbytes / 2**20, 1))
+            transcription = result["text"].strip()
+            
+            # Update UI in main thread
+            self.ui.call(self.update_transcription, transcription)
                 
         except Exception as e:
             error_msg = f"Transcription error: {str(e)}"
-            self.root.after(0, lambda: self.status_label.config(
-                text=error_msg, foreground="red"))
-            # Cancel timeout if it exists
-            if self.processing_timeout:
-                self.root.after_cancel(self.processing_timeout)
-                self.processing_timeout = None
+            self.ui.status(error_msg, "red")
             
-    def handle_processing_timeout(self):
+    def cancel_processing_timeout(self, clip):
+        """Cancel a recording's processing timeout, if it is pending"""
+        if clip.timeout:
+            self.root.after_cancel(clip.timeout)
+            clip.timeout = None
+
+    def handle_processing_timeout(self, clip):
         """Handle processing timeout"""
         self.status_label.config(text="Processing timeout - Please try again", foreground="red")
-        self.processing_timeout = None
+        clip.timeout = None
         
+    def arm_profiler(self, event=None):
+        """Hidden shortcut: profile the next recording"""
+        self.profiler.arm(1)
+        self.status_label.config(text="Profiling the next recording", foreground="blue")
+
+    def load_engine(self, model_name, startup=False):
+        """Load (or reuse) the engine for a model, keeping at most max_engines loaded.
+
+        Only on start-up may a missing model be downloaded (if allowed) and a
+        new model's speed be measured; mid-session, auto mode only switches
+        between prefetched models.
+        """
+        with self.engine_lock:
+            engine = self.engines.pop(model_name, None)
+            if engine is not None:
+                exported_metrics.inc("engine_cache_hits_total", model=model_name)
+            else:
+                exported_metrics.inc("engine_cache_misses_total", model=model_name)
+                model = model_store.load_model(model_name, allow_download=None if startup else False)
+                engine = TranscriptionEngine(model, model_name)
+                if startup and self.model_selector is not None and not self.model_selector.measurements(model_name):
+                    self.model_selector.warm_up(engine)
+            # Least recently used first; the start-up engine also builds the features, so it stays
+            self.engines[model_name] = engine
+            for name in list(self.engines):
+                if len(self.engines) <= self.max_engines:
+                    break
+                if name != model_name and self.engines[name] is not self.engine:
+                    del self.engines[name]
+            return engine
+
+    def transcribe_clip(self, mel, backlog=(), **metrics):
+        """Transcribe a clip's features, choosing the model for its length in auto mode"""
+        engine = self.engine
+        clip_start = time.time() - TranscriptionEngine.mel_seconds(mel)
+        if self.model_selector is not None:
+            duration = TranscriptionEngine.mel_seconds(mel)
+            engine = self.load_engine(self.model_selector.choose(duration, backlog))
+            metrics["auto"] = True
+        decode_options = dict(self.decode_options)
+        if self.use_context:
+            decode_options["initial_prompt"] = self.context.prompt(engine.count_tokens, engine.max_prompt_tokens)
+            metrics["context"] = True
+        with self.scheduler.slot(DecodeScheduler.INTERACTIVE) as slot:
+            metrics["scheduler_wait"] = slot.wait_seconds
+            result = engine.transcribe_mel(mel, metrics=metrics, **decode_options)
+        self.context.add(result["text"])
+        self.save_history(result["segments"], engine.name, clip_start)
+        if self.model_selector is not None:
+            self.model_selector.observe(result["metrics"])
+        return result
+
+    def transcription_worker(self):
+        """Transcribe hands-free utterances one at a time, in the order they ended"""
+        while True:
+            utterance = self.utterance_queue.get()
+            exported_metrics.set("queue_depth", self.utterance_queue.qsize(), queue="hands_free")
+            mel = utterance["mel_builder"].result()
+            if utterance["peak"] < 0.01:
+                continue
+            try:
+                backlog = [queued["duration"] for queued in list(self.utterance_queue.queue)]
+                result = self.transcribe_clip(
+                    mel, backlog, capture_buffer_mb=round(self.capture_buffer.nbytes / 2**20, 1),
+                    hands_free=True)
+                transcription = result["text"].strip()
+                if transcription:
+                    self.ui.call(self.update_transcription, transcription)
+            except Exception as e:
+                error_msg = f"Transcription error: {str(e)}"
+                self.ui.status(error_msg, "red")
+                
     def update_transcription(self, text):
         """Update the transcription text area"""
-        # Cancel timeout if it exists
-        if self.processing_timeout:
-            self.root.after_cancel(self.processing_timeout)
-            self.processing_timeout = None
             
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
@@ -265,12 +541,138 @@ class WindowsSpeechTranscriptionTool:
         self.transcription_text.insert(tk.END, text)
         self.transcription_text.see(tk.END)
         
-        self.status_label.config(text="Transcription complete - Ready to record", 
-                               foreground="green")
+        status = "Transcription complete - Ready to record"
+        if self.recording:
+            # The next recording started while this one was being decoded
+            status = "Listening... Pause between sentences" if self.dictation is not None else "Recording..."
+        summary = self.capture_buffer.drop_summary() if self.capture_buffer else ""
+        if summary:
+            status += f" ({summary})"
+        self.status_label.config(text=status, foreground="red" if self.recording else "green")
+        
+    def import_audio(self):
+        """Transcribe an audio file chosen by the user"""
+        if self.model_loading or self.engine is None:
+            messagebox.showwarning("Please Wait", "Whisper model is still loading. Please wait.")
+            return
+        if self.importing:
+            messagebox.showwarning("Busy", "Please wait for the current import to finish.")
+            return
+
+        from tkinter import filedialog
+        filename = filedialog.askopenfilename(
+            filetypes=[("Audio files", "*.wav *.flac *.ogg *.opus *.mp3 *.aiff"), ("All files", "*.*")]
+        )
+        if filename:
+            self.importing = True
+            threading.Thread(target=self.transcribe_file, args=(filename,), daemon=True).start()
+
+    def transcribe_file(self, filename):
+        """Decode an imported file in blocks, appending the text of each window as it is ready"""
+        name = os.path.basename(filename)
+        self.ui.call(self.append_transcription, f"{name}\n", True)
+        start_time = time.perf_counter()
+        duration = 0.0
+        memory = {}
+        fallbacks = 0
+        aborts = 0
+        first = True
+        import_time = time.time()
+        scheduling = {"wait_seconds": 0.0}
+        try:
+            windows = self.engine.iter_file_windows(filename, **self.decode_options)
+            for window in self.scheduler.iter_bulk(windows, scheduling):
+                duration = window["duration"]
+                memory = window["memory"]
+                fallbacks += window["fallbacks"]
+                aborts += bool(window["aborted"])
+                self.save_history(window["segments"], self.engine.name, import_time)
+                text = "".join(segment["text"] for segment in window["segments"])
+                if first:
+                    text = text.lstrip()
+                if text:
+                    first = False
+                    self.ui.text(text)
+                percent = window["position"] * 100 / duration if duration else 100
+                status = f"Importing {name}: {percent:.0f}%"
+                self.ui.status(status, "orange")
+
+            elapsed = time.perf_counter() - start_time
+            log_metrics("import", file=name, model=self.engine.name, audio_seconds=duration,
+                        seconds=elapsed, fallbacks=fallbacks, aborts=aborts,
+                        scheduler_wait=scheduling["wait_seconds"], **memory)
+            status = f"Imported {name} ({duration:.0f}s of audio in {elapsed:.0f}s) - Ready to record"
+            self.ui.status(status, "green")
+        except Exception as e:
+            error_msg = f"Import error: {str(e)}"
+            self.ui.status(error_msg, "red")
+        finally:
+            self.importing = False
+
+    def save_history(self, segments, model, start_time):
+        """Add segments to the searchable history; a failure does not stop transcription"""
+        try:
+            self.history.add(segments, model, start_time)
+        except Exception as e:
+            print(f"History error: {e}")
+
+    def search_history(self):
+        """Search every past transcript for segments containing all the typed words"""
+        window = tk.Toplevel(self.root)
+        window.title("Search History")
+        window.geometry("700x400")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(1, weight=1)
+        
+        query_var = tk.StringVar()
+        entry = ttk.Entry(window, textvariable=query_var)
+        entry.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=10, pady=10)
+        summary_label = ttk.Label(window, text="Type words and press Enter")
+        summary_label.grid(row=0, column=1, padx=(0, 10))
+        results_text = scrolledtext.ScrolledText(window, wrap=tk.WORD)
+        results_text.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S),
+                          padx=10, pady=(0, 10))
         
+        def run_search(event=None):
+            start_time = time.perf_counter()
+            try:
+                results = self.history.search(query_var.get())
+            except Exception as e:
+                summary_label.config(text=f"Search error: {str(e)}")
+                return
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            results_text.delete("1.0", tk.END)
+            for result in results:
+                results_text.insert(tk.END, format_result(result) + "\n\n")
+            summary_label.config(text=f"{len(results)} match(es) in {elapsed_ms:.0f} ms")
+            
+        entry.bind("<Return>", run_search)
+        entry.focus_set()
+
+    def append_transcription(self, text, new_entry=False):
+        """Append imported text, optionally starting a new timestamped entry.
+
+        Text goes to the end of the import's entry, so clips recorded while
+        a file is imported come after it instead of splitting it.
+        """
+        if new_entry:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if self.transcription_text.get("1.0", tk.END).strip():
+                self.transcription_text.insert(tk.END, f"\n\n[{timestamp}] ")
+            else:
+                self.transcription_text.insert(tk.END, f"[{timestamp}] ")
+            self.transcription_text.mark_set("import_end", "end-1c")
+            # Left gravity: text inserted at the end by other entries stays after the mark
+            self.transcription_text.mark_gravity("import_end", tk.LEFT)
+        index = self.transcription_text.index("import_end")
+        self.transcription_text.insert(index, text)
+        self.transcription_text.mark_set("import_end", f"{index} + {len(text)} chars")
+        self.transcription_text.see("import_end")
+
     def clear_text(self):
-        """Clear the transcription text"""
+        """Clear the transcription text and the context carried into the next clip"""
         self.transcription_text.delete("1.0", tk.END)
+        self.context.reset()
         
     def copy_to_clipboard(self):
         """Copy transcription to clipboard"""
@@ -304,6 +706,12 @@ class WindowsSpeechTranscriptionTool:
                 messagebox.showerror("Save Error", f"Could not save file: {str(e)}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Speech transcription")
+    parser.add_argument("--profile", type=int, default=0, metavar="N",
+                        help="profile the next N recordings (see job_profiler.py)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="also trace memory allocations while profiling")
+    args = parser.parse_args()
     print("Windows Speech Transcription Tool")
     print("Make sure you have granted microphone permissions to Python")
     print()
@@ -325,11 +733,15 @@ def main():
         pass
         
     app = WindowsSpeechTranscriptionTool(root)
+    if args.profile:
+        app.profiler.arm(args.profile, args.profile_memory)
     
     # Handle window closing
     def on_closing():
         if hasattr(app, 'recording') and app.recording:
             app.stop_recording()
+        if app.input is not None:
+            app.input.close()
         root.destroy()
         
     root.protocol("WM_DELETE_WINDOW", on_closing)
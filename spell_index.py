@@ -0,0 +1,314 @@
+"""Offline spell check on a precomputed symmetric-delete (SymSpell) index.
+
+    python spell_index.py build                   # from pyspellchecker's English dictionary
+    python spell_index.py build --words freq.txt  # from "word count" lines
+    python spell_index.py check transcript.txt
+
+Every dictionary word is stored under the strings made by deleting up to
+``max_edit`` characters from its first ``prefix_length`` characters.  A
+misspelling shares one of those keys with the words close to it, so the
+candidates for a word are found with a few binary searches instead of an
+edit-distance scan of the dictionary; only the candidates are then
+checked with a real edit distance.  Keys are CRC-32 hashes kept in sorted
+numpy arrays under ``~/.speech_transcription/spell_index`` (override with
+``TRANSCRIBE_SPELL_INDEX``) and memory-mapped when first used.
+
+Words in the custom vocabulary (``vocabulary.txt`` in the data folder, or
+``TRANSCRIBE_VOCABULARY``) and the glossary are always accepted and are
+offered as suggestions too.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from app_paths import data_dir
+from session_context import load_glossary
+
+WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)*")
+
+
+def default_index_dir():
+    """Location of the index files"""
+    path = os.environ.get("TRANSCRIBE_SPELL_INDEX")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        return path
+    return data_dir("spell_index")
+
+
+def vocabulary_path():
+    """Location of the custom vocabulary file"""
+    return os.environ.get("TRANSCRIBE_VOCABULARY", os.path.join(data_dir(), "vocabulary.txt"))
+
+
+def load_vocabulary():
+    """Custom vocabulary and glossary words"""
+    try:
+        with open(vocabulary_path(), encoding="utf-8") as f:
+            words = [line.strip() for line in f]
+    except FileNotFoundError:
+        words = []
+    for term in load_glossary():
+        words.extend(term.split())
+    return [word for word in words if word]
+
+
+def default_word_counts():
+    """English word frequencies shipped with pyspellchecker"""
+    from spellchecker import SpellChecker
+    return dict(SpellChecker(language="en").word_frequency.dictionary)
+
+
+def read_word_counts(path):
+    """Word frequencies from a file of "word count" lines (a missing count is 1)"""
+    counts = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                counts[parts[0].lower()] = int(parts[1]) if len(parts) > 1 else 1
+    return counts
+
+
+def deletes(word, max_edit, prefix_length):
+    """The word's prefix and every string made by deleting up to max_edit characters from it"""
+    found = {word[:prefix_length]}
+    frontier = found
+    for _ in range(max_edit):
+        frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier
+                    for i in range(len(candidate))}
+        found |= frontier
+    return found
+
+
+def letter_counts(word):
+    """How often each of a-z (and anything else, in the last column) occurs in a word"""
+    counts = np.zeros(27, dtype=np.uint8)
+    for char in word:
+        index = ord(char) - ord("a")
+        counts[index if 0 <= index < 26 else 26] += 1
+    return counts
+
+
+def _key(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def build_index(word_counts, path=None, max_edit=2, prefix_length=7):
+    """Write the index for a {word: count} dictionary; returns the number of keys"""
+    path = path or default_index_dir()
+    os.makedirs(path, exist_ok=True)
+    words = sorted(word_counts, key=lambda word: (-word_counts[word], word))
+    keys = []
+    ids = []
+    for word_id, word in enumerate(words):
+        for text in deletes(word, max_edit, prefix_length):
+            keys.append(_key(text))
+            ids.append(word_id)
+    pairs = np.unique((np.array(keys, dtype=np.uint64) << np.uint64(32)) | np.array(ids, dtype=np.uint64))
+    np.save(os.path.join(path, "keys.npy"), (pairs >> np.uint64(32)).astype(np.uint32))
+    np.save(os.path.join(path, "ids.npy"), (pairs & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+    np.save(os.path.join(path, "counts.npy"), np.array([word_counts[word] for word in words], dtype=np.uint32))
+    np.save(os.path.join(path, "letters.npy"), np.array([letter_counts(word) for word in words]))
+    with open(os.path.join(path, "words.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(words))
+    # Written last: an index without its meta file is incomplete
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"max_edit": max_edit, "prefix_length": prefix_length, "words": len(words)}, f)
+    return len(pairs)
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 if above limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # A shared prefix or suffix does not change the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    if not a or not b:
+        return len(a) + len(b)
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellIndex:
+    """Lazily loaded SymSpell index plus the custom vocabulary"""
+
+    def __init__(self, path=None):
+        self.path = path or default_index_dir()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.custom = set()
+        self._suggestions = {}
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, "meta.json"))
+
+    def load(self):
+        """Map the index files and read the word list (once)"""
+        with self._lock:
+            if self._loaded:
+                return
+            with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            self.max_edit = meta["max_edit"]
+            self.prefix_length = meta["prefix_length"]
+            self.keys = np.load(os.path.join(self.path, "keys.npy"), mmap_mode="r")
+            self.ids = np.load(os.path.join(self.path, "ids.npy"), mmap_mode="r")
+            self.counts = np.load(os.path.join(self.path, "counts.npy"), mmap_mode="r")
+            self.letters = np.load(os.path.join(self.path, "letters.npy"), mmap_mode="r")
+            with open(os.path.join(self.path, "words.txt"), encoding="utf-8") as f:
+                self.words = f.read().split("\n")
+            self.word_ids = {word: i for i, word in enumerate(self.words)}
+            self.custom = {word.lower() for word in load_vocabulary()}
+            self._loaded = True
+
+    def known(self, word):
+        if not self._loaded:
+            self.load()
+        word = word.lower()
+        if word in self.word_ids or word in self.custom:
+            return True
+        # Possessives and contractions the dictionary lacks
+        base = word.split("'")[0]
+        return "'" in word and (base in self.word_ids or base in self.custom)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def suggest(self, word, limit=3):
+        """Closest dictionary or custom words, nearest and most frequent first, in the word's case"""
+        self.load()
+        key = (word.lower(), limit)
+        if key not in self._suggestions:
+            self._suggestions[key] = self._suggest(key[0], limit)
+        return [_match_case(word, suggestion) for suggestion in self._suggestions[key]]
+
+    def _suggest(self, word, limit):
+        # Almost every short word is two edits from a short misspelling
+        max_edit = 1 if len(word) <= 4 else self.max_edit
+        hashes = np.array(sorted(_key(text) for text in deletes(word, max_edit, self.prefix_length)),
+                          dtype=np.uint32)
+        starts = np.searchsorted(self.keys, hashes, "left")
+        ends = np.searchsorted(self.keys, hashes, "right")
+        candidate_ids = np.unique(np.concatenate([self.ids[start:end] for start, end in zip(starts, ends)]))
+        # Each edit adds or removes at most one letter of each kind, so words whose
+        # letter counts differ by more than max_edit either way cannot be close
+        difference = self.letters[candidate_ids].astype(np.int16) - letter_counts(word)
+        extra = np.maximum(difference, 0).sum(axis=1)
+        missing = np.maximum(-difference, 0).sum(axis=1)
+        candidate_ids = candidate_ids[np.maximum(extra, missing) <= max_edit]
+        scored = []
+        for word_id in candidate_ids.tolist():
+            distance = edit_distance(word, self.words[word_id], max_edit)
+            if distance <= max_edit:
+                scored.append((distance, -int(self.counts[word_id]), self.words[word_id]))
+        for custom in self.custom:
+            distance = edit_distance(word, custom, max_edit)
+            if distance <= max_edit:
+                # Custom words rank above dictionary words at the same distance
+                scored.append((distance, -2**32, custom))
+        return [candidate for _, _, candidate in sorted(scored)[:limit]]
+
+    def check(self, text, limit=3):
+        """Unknown words in text: dicts with start, end (character offsets), word and suggestions.
+
+        Capitalized words are taken as names unless they start a sentence;
+        all-caps words are taken as acronyms.
+        """
+        self.load()
+        problems = []
+        for match in WORD_RE.finditer(text):
+            word = match.group()
+            if self.known(word) or word.isupper() and len(word) > 1:
+                continue
+            if word[0].isupper() and not _starts_sentence(text, match.start()):
+                continue
+            problems.append({"start": match.start(), "end": match.end(), "word": word,
+                             "suggestions": self.suggest(word, limit)})
+        return problems
+
+    def add_word(self, word):
+        """Accept a word from now on and add it to the custom vocabulary file"""
+        word = word.strip()
+        if not word or word.lower() in self.custom:
+            return
+        self.custom.add(word.lower())
+        self._suggestions.clear()
+        with open(vocabulary_path(), "a", encoding="utf-8") as f:
+            f.write(word + "\n")
+
+
+def _starts_sentence(text, offset):
+    before = text[:offset].rstrip()
+    return not before or before[-1] in ".!?]\n"
+
+
+def _match_case(word, suggestion):
+    return suggestion[:1].upper() + suggestion[1:] if word[:1].isupper() else suggestion
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or use the spell-check index")
+    parser.add_argument("--index", default=None, help=f"index folder (default: {default_index_dir()})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="build the index")
+    build_parser.add_argument("--words", help="word list with counts (default: pyspellchecker's English)")
+    build_parser.add_argument("--max-edit", type=int, default=2)
+    build_parser.add_argument("--prefix-length", type=int, default=7)
+    check_parser = sub.add_parser("check", help="list unknown words in text files")
+    check_parser.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start_time = time.perf_counter()
+        counts = read_word_counts(args.words) if args.words else default_word_counts()
+        keys = build_index(counts, args.index, args.max_edit, args.prefix_length)
+        print(f"Indexed {len(counts)} words under {keys} keys in {time.perf_counter() - start_time:.1f}s")
+        return 0
+
+    index = SpellIndex(args.index)
+    if not index.exists():
+        print("No spell-check index; run: python spell_index.py build", file=sys.stderr)
+        return 1
+    index.load()
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        start_time = time.perf_counter()
+        problems = index.check(text)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        for problem in problems:
+            line = text.count("\n", 0, problem["start"]) + 1
+            print(f"{path}:{line}: {problem['word']} -> {', '.join(problem['suggestions']) or '?'}")
+        print(f"{path}: {len(problems)} unknown word(s) in {elapsed_ms:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Headless transcription of audio files of any length.
+
+    python transcribe_file.py lecture.flac meeting.wav --model base
+
+Each file is read in blocks and decoded one 30 s window at a time; the text
+is written to ``<file>.txt`` (or ``--output``) as soon as each window is done,
+so memory use does not grow with the length of the recording.  If a run is
+interrupted, running the same command again resumes from the last window.
+With ``--workers N`` a file is instead cut into chunks at pauses and
+decoded on N processes at once (see parallel_transcribe.py).
+"""
+import argparse
+import os
+import sys
+import time
+
+import soundfile as sf
+from whisper.audio import HOP_LENGTH, SAMPLE_RATE
+
+import model_store
+from metrics_log import log_metrics
+from model_selection import ModelSelector
+from parallel_transcribe import transcribe_parallel
+from transcript_checkpoint import TranscriptCheckpoint
+from transcription_engine import TranscriptionEngine
+
+
+def transcribe_to_file(engine, path, output, show_progress=True, resume=True, **decode_options):
+    """Transcribe one audio file into a text file; returns its metrics record.
+
+    Progress is checkpointed in ``<output>.ckpt`` after every window, and an
+    interrupted run continues from its last checkpoint when ``resume`` is set.
+    """
+    name = os.path.basename(path)
+    start_time = time.perf_counter()
+    duration = 0.0
+    memory = {}
+    fallbacks = 0
+    aborts = 0
+    checkpoint = TranscriptCheckpoint(output + ".ckpt", path, engine.name)
+    state, _ = checkpoint.load() if resume else (None, [])
+    if state and (not os.path.exists(output) or os.path.getsize(output) < state["output_bytes"]):
+        state = None
+    checkpoint.start(resumed=state is not None)
+    if state:
+        print(f"{name}: resuming at {state['seek'] * HOP_LENGTH / SAMPLE_RATE:.0f}s", file=sys.stderr)
+
+    try:
+        with open(output, "r+b" if state else "wb") as f:
+            if state:
+                # Drop text written after the last checkpoint
+                f.truncate(state["output_bytes"])
+                f.seek(state["output_bytes"])
+            first = not state or not state["output_bytes"]
+            for window in engine.iter_file_windows(path, resume=state, **decode_options):
+                duration = window["duration"]
+                memory = window["memory"]
+                fallbacks += window["fallbacks"]
+                aborts += bool(window["aborted"])
+                text = "".join(segment["text"] for segment in window["segments"])
+                if first:
+                    text = text.lstrip()
+                if text:
+                    first = False
+                    f.write(text.encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                checkpoint.record(window, f.tell())
+                if show_progress and duration:
+                    print(f"\r{name}: {window['position'] * 100 / duration:3.0f}%", end="",
+                          file=sys.stderr, flush=True)
+            f.write(b"\n")
+        checkpoint.remove()
+    finally:
+        # An interrupted run keeps its checkpoint file, to be resumed later
+        checkpoint.close()
+    elapsed = time.perf_counter() - start_time
+    if show_progress:
+        print(f"\r{name}: {duration:.0f}s of audio in {elapsed:.1f}s -> {output}", file=sys.stderr)
+    record = dict(file=name, model=engine.name, audio_seconds=duration, seconds=elapsed,
+                  fallbacks=fallbacks, aborts=aborts, **memory)
+    log_metrics("import", **record)
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe audio files with bounded memory use")
+    parser.add_argument("files", nargs="+", help="audio files (any format soundfile can read)")
+    parser.add_argument("-m", "--model", default="base", choices=model_store.available_models() + ["auto"],
+                        help="model, or 'auto' to pick one per file from measured speed")
+    parser.add_argument("--latency-target", type=float,
+                        help="seconds a file may take with --model auto (default: TRANSCRIBE_LATENCY_TARGET)")
+    parser.add_argument("-o", "--output", help="output text file (only with a single input file)")
+    parser.add_argument("--language", help="spoken language (detected when omitted)")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore checkpoints of interrupted runs and start from the beginning")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="decode each file in chunks on this many processes (no resume)")
+    args = parser.parse_args(argv)
+    if args.output and len(args.files) > 1:
+        parser.error("--output can only be used with a single input file")
+
+    selector = None
+    if args.model == "auto":
+        # Parallel runs would not tell the selector how fast a model is on its own
+        if args.workers > 1:
+            parser.error("--model auto cannot be used with --workers")
+        # As in the app, auto mode only picks between prefetched models
+        stored = [name for name in model_store.read_manifest() if model_store.is_prefetched(name)]
+        if not stored:
+            parser.error("--model auto needs prefetched models; run: python model_store.py prefetch tiny base")
+        selector = ModelSelector(stored, args.latency_target)
+    engines = {}  # least recently used first
+    max_engines = 2
+    failed = 0
+    for path in args.files:
+        output = args.output or os.path.splitext(path)[0] + ".txt"
+        try:
+            name = args.model
+            if selector:
+                name = selector.choose(sf.info(path).duration)
+                print(f"{os.path.basename(path)}: using {name}", file=sys.stderr)
+            if args.workers > 1:
+                transcribe_parallel(path, name, output, args.workers, language=args.language, task="transcribe")
+                continue
+            engine = engines.pop(name, None)
+            if engine is None:
+                engine = TranscriptionEngine(model_store.load_model(name), name)
+                if selector and not selector.measurements(name):
+                    selector.warm_up(engine)
+            engines[name] = engine
+            while len(engines) > max_engines:
+                del engines[next(iter(engines))]
+            record = transcribe_to_file(engine, path, output, resume=not args.restart,
+                                        language=args.language, task="transcribe")
+            if selector:
+                selector.observe(record)
+        except Exception as e:
+            print(f"\n{path}: {e}", file=sys.stderr)
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
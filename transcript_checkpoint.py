@@ -0,0 +1,83 @@
+import json
+import os
+
+
+class TranscriptCheckpoint:
+    """Append-only, per-window checkpoint log for one file transcription.
+
+    The first line identifies the source file and model; every decoded
+    window then appends one line with the decoder state after it (audio
+    offset, previous-text prompt, mel normalization level), the segments it
+    produced and how many bytes of transcript had been written.  Lines are
+    fsynced, and a torn last line left by a crash is ignored on load.
+    """
+
+    def __init__(self, path, source, model):
+        self.path = path
+        st = os.stat(source)
+        self.header = {"source": os.path.abspath(source), "size": st.st_size,
+                       "mtime_ns": st.st_mtime_ns, "model": model}
+        self._file = None
+        self._valid_bytes = 0
+
+    def load(self):
+        """Return (last window record, all segments so far), or (None, []) to start over"""
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().split(b"\n")
+        except FileNotFoundError:
+            return None, []
+        records = []
+        valid_bytes = 0
+        for line in lines[:-1]:  # the last piece has no newline: empty or torn
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid_bytes += len(line) + 1
+        if len(records) < 2 or records[0] != self.header:
+            return None, []
+        self._valid_bytes = valid_bytes
+        segments = [segment for record in records[1:] for segment in record["segments"]]
+        return records[-1], segments
+
+    def start(self, resumed):
+        """Open the log for appending, starting a new one unless resuming"""
+        if resumed:
+            self._file = open(self.path, "r+b")
+            self._file.truncate(self._valid_bytes)
+            self._file.seek(self._valid_bytes)
+        else:
+            self._file = open(self.path, "wb")
+            self._append(self.header)
+
+    def record(self, window, output_bytes):
+        """Checkpoint a decoded window once its text is safely in the transcript"""
+        self._append({
+            "seek": window["seek"],
+            "language": window["language"],
+            "next_segment_id": window["next_segment_id"],
+            "prompt": window["prompt"],
+            "max_value": window["max_value"],
+            "output_bytes": output_bytes,
+            "segments": [{key: segment[key] for key in ("id", "start", "end", "text")}
+                         for segment in window["segments"]],
+        })
+
+    def remove(self):
+        """Delete the log once the transcript is complete"""
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _append(self, record):
+        self._file.write((json.dumps(record) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
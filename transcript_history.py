@@ -0,0 +1,186 @@
+"""Searchable history of every transcribed segment.
+
+    python transcript_history.py search invoice march
+    python transcript_history.py stats
+
+Segments are kept in SQLite (``~/.speech_transcription/history.db``,
+override with ``TRANSCRIBE_HISTORY_DB``) in a compact form: start time and
+duration as integer milliseconds, model and session names interned into
+small integer ids, and an inverted index from each word to the segments
+containing it.  A search looks up the rarest query word's postings, newest
+first, and checks the other words by primary key, so it takes milliseconds
+however long the history is.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from app_paths import data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS models (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    session INTEGER NOT NULL,
+    model INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL,  -- wall clock, ms since the epoch
+    duration_ms INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY,
+    word TEXT UNIQUE NOT NULL,
+    segments INTEGER NOT NULL DEFAULT 0  -- document frequency
+);
+CREATE TABLE IF NOT EXISTS postings (
+    word INTEGER NOT NULL,
+    segment INTEGER NOT NULL,
+    PRIMARY KEY (word, segment)
+) WITHOUT ROWID;
+"""
+
+WORD_RE = re.compile(r"\w+(?:'\w+)*")
+
+
+def default_db_path():
+    """Location of the history database"""
+    return os.environ.get("TRANSCRIBE_HISTORY_DB", os.path.join(data_dir(), "history.db"))
+
+
+def words(text):
+    """Distinct lower-case words of a text, in order"""
+    return list(dict.fromkeys(WORD_RE.findall(text.lower())))
+
+
+class TranscriptHistory:
+    """Segment store with an inverted word index; safe to share between threads"""
+
+    def __init__(self, path=None, session=None):
+        self.path = path or default_db_path()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._ids = {}
+        self.session = session or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def close(self):
+        self.db.close()
+
+    def add(self, segments, model, start_time=None):
+        """Store a clip's segments (whisper dicts with start/end/text seconds into the clip).
+
+        ``start_time`` is the wall-clock time the clip started (default: now).
+        """
+        start_time = time.time() if start_time is None else start_time
+        with self._lock:
+            try:
+                self._add(segments, model, start_time)
+            except Exception:
+                # Ids interned in the rolled-back transaction are gone
+                self._ids.clear()
+                raise
+
+    def _add(self, segments, model, start_time):
+        with self.db:
+            session_id = self._intern("sessions", self.session)
+            model_id = self._intern("models", model)
+            for segment in segments:
+                text = segment["text"].strip()
+                if not text:
+                    continue
+                cursor = self.db.execute(
+                    "INSERT INTO segments (session, model, start_ms, duration_ms, text) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, model_id, round((start_time + segment["start"]) * 1000),
+                     round((segment["end"] - segment["start"]) * 1000), text))
+                segment_id = cursor.lastrowid
+                for word in words(text):
+                    word_id = self._intern("words", word)
+                    self.db.execute("INSERT INTO postings (word, segment) VALUES (?, ?)", (word_id, segment_id))
+                    self.db.execute("UPDATE words SET segments = segments + 1 WHERE id = ?", (word_id,))
+
+    def search(self, query, limit=100):
+        """Newest segments containing every word of the query, as dicts"""
+        query_words = words(query)
+        if not query_words:
+            return []
+        with self._lock:
+            found = []
+            for word in query_words:
+                row = self.db.execute("SELECT id, segments FROM words WHERE word = ?", (word,)).fetchone()
+                if row is None:
+                    return []
+                found.append(row)
+            found.sort(key=lambda row: row[1])
+            rarest, others = found[0][0], [row[0] for row in found[1:]]
+            sql = "SELECT p.segment FROM postings p WHERE p.word = ?"
+            for _ in others:
+                sql += " AND EXISTS (SELECT 1 FROM postings q WHERE q.word = ? AND q.segment = p.segment)"
+            sql += " ORDER BY p.segment DESC LIMIT ?"
+            segment_ids = [row[0] for row in self.db.execute(sql, [rarest] + others + [limit])]
+            rows = self.db.execute(
+                "SELECT s.id, s.start_ms, s.duration_ms, s.text, sessions.name, models.name FROM segments s "
+                "JOIN sessions ON sessions.id = s.session JOIN models ON models.id = s.model "
+                f"WHERE s.id IN ({','.join('?' * len(segment_ids))}) ORDER BY s.id DESC",
+                segment_ids).fetchall()
+        return [{"id": row[0], "time": row[1] / 1000, "duration": row[2] / 1000, "text": row[3],
+                 "session": row[4], "model": row[5]} for row in rows]
+
+    def stats(self):
+        with self._lock:
+            counts = {table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("segments", "sessions", "words", "postings")}
+        counts["file_mb"] = round(os.path.getsize(self.path) / 2**20, 1)
+        return counts
+
+    def _intern(self, table, name):
+        """Id of a session, model or word, added if new"""
+        key = (table, name)
+        if key not in self._ids:
+            column = "word" if table == "words" else "name"
+            self.db.execute(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", (name,))
+            self._ids[key] = self.db.execute(
+                f"SELECT id FROM {table} WHERE {column} = ?", (name,)).fetchone()[0]
+        return self._ids[key]
+
+
+def format_result(result):
+    timestamp = datetime.fromtimestamp(result["time"]).strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{timestamp}] {result['text']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the transcript history")
+    parser.add_argument("--db", default=None, help=f"history database (default: {default_db_path()})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    search_parser = sub.add_parser("search", help="find segments containing all the words")
+    search_parser.add_argument("words", nargs="+")
+    search_parser.add_argument("-n", "--limit", type=int, default=20)
+    sub.add_parser("stats", help="show the size of the history")
+    args = parser.parse_args(argv)
+
+    history = TranscriptHistory(args.db)
+    try:
+        if args.command == "search":
+            start_time = time.perf_counter()
+            results = history.search(" ".join(args.words), args.limit)
+            for result in results:
+                print(format_result(result))
+            print(f"{len(results)} segment(s) in {(time.perf_counter() - start_time) * 1000:.1f} ms",
+                  file=sys.stderr)
+        else:
+            for key, value in history.stats().items():
+                print(f"{key}: {value}")
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+import time
+
+import torch
+from whisper.audio import HOP_LENGTH, N_FRAMES, SAMPLE_RATE, pad_or_trim
+from whisper.decoding import DecodingOptions, DecodingTask
+from whisper.tokenizer import get_tokenizer
+
+from audio_file import FileFeatures
+from decode_guard import RunawayGuard
+from mel_features import IncrementalLogMel, PaddedMel
+from memory_usage import PeakRSSMonitor, as_mib
+from metrics_log import log_metrics
+
+
+class TranscriptionEngine:
+    """Whisper decoding over log-mel features that were computed ahead of time"""
+
+    def __init__(self, model, name=None):
+        self.model = model
+        self.name = name or repr(model.dims)  # identifies the model in checkpoints and metrics
+
+        # Same defaults as whisper.transcribe
+        self.temperatures = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+        self.compression_ratio_threshold = 2.4
+        self.logprob_threshold = -1.0
+        self.no_speech_threshold = 0.6
+        self.condition_on_previous_text = True
+        # Stop decodes that loop or hallucinate instead of running to the token limit
+        self.abort_runaway = True
+        self._tokenizer = None
+
+    @staticmethod
+    def mel_seconds(mel):
+        """Audio duration of a padded mel"""
+        return (mel.shape[-1] - N_FRAMES) * HOP_LENGTH / SAMPLE_RATE
+
+    @property
+    def max_prompt_tokens(self):
+        """Prompt tokens the decoder looks at; it drops older ones"""
+        return self.model.dims.n_text_ctx // 2 - 1
+
+    def count_tokens(self, text):
+        """Tokens text takes up as a prompt"""
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages)
+        return len(self._tokenizer.encode(" " + text.strip()))
+
+    def new_feature_builder(self):
+        """Start incremental mel extraction for a new clip"""
+        return IncrementalLogMel(self.model.dims.n_mels)
+
+    def transcribe_mel(self, mel, metrics=None, **decode_options):
+        """Transcribe a padded mel (as returned by IncrementalLogMel.result).
+
+        Logs a ``transcription`` metrics record with the decode time, RSS
+        before and at its peak, the mel size, the number of windows, of
+        temperature-fallback re-decodes and of aborted runaway decodes, and
+        any extra ``metrics`` fields.
+        """
+        segments = []
+        language = None
+        windows = 0
+        fallbacks = 0
+        aborts = 0
+        start_time = time.perf_counter()
+        with PeakRSSMonitor() as memory:
+            for window in self.iter_windows(mel, **decode_options):
+                language = window["language"]
+                segments.extend(window["segments"])
+                windows += 1
+                fallbacks += window["fallbacks"]
+                aborts += bool(window["aborted"])
+        record = {
+            "model": self.name,
+            "audio_seconds": self.mel_seconds(mel),
+            "seconds": time.perf_counter() - start_time,
+            "mel_mb": as_mib(mel.nbytes),
+            "windows": windows,
+            "fallbacks": fallbacks,
+            "aborts": aborts,
+        }
+        record.update(memory.fields())
+        record.update(metrics or {})
+        log_metrics("transcription", **record)
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": language,
+            "metrics": record,
+        }
+
+    def transcribe_file(self, path, **decode_options):
+        """Transcribe an audio file of any length with bounded memory"""
+        segments = []
+        language = None
+        for window in self.iter_file_windows(path, **decode_options):
+            language = window["language"]
+            segments.extend(window["segments"])
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": language,
+        }
+
+    def iter_file_windows(self, path, resume=None, **decode_options):
+        """Decode an audio file window by window while reading it in blocks.
+
+        Each window carries the state needed to resume the file later; pass
+        the last one as ``resume`` to continue from there.  ``memory`` holds
+        the RSS before the file was opened, its peak so far and the most mel
+        frame memory held at once.
+        """
+        if resume:
+            features = FileFeatures(path, self.model.dims.n_mels, start_frame=resume["seek"],
+                                    max_value=resume["max_value"])
+        else:
+            features = FileFeatures(path, self.model.dims.n_mels)
+        try:
+            with PeakRSSMonitor() as memory:
+                for window in self.iter_windows(features, resume=resume, **decode_options):
+                    window["position"] = min(window["seek"] * HOP_LENGTH / SAMPLE_RATE, features.duration)
+                    window["duration"] = features.duration
+                    window["max_value"] = features.max_value
+                    window["memory"] = dict(memory.fields(), feature_mb=as_mib(features.peak_bytes))
+                    yield window
+        finally:
+            features.close()
+
+    def iter_windows(self, features, initial_prompt=None, resume=None, **decode_options):
+        """Decode one 30 s window at a time, yielding the segments of each.
+
+        ``features`` is a padded mel array or an object with a
+        ``window(seek)`` method returning (mel window, content frames).
+        Besides its segments, every yielded window has the decoder state after
+        it (``seek``, ``language``, ``next_segment_id``, ``prompt``), which
+        ``resume`` accepts to carry on from that point, ``fallbacks``, the
+        number of times the window was re-decoded at a higher temperature, and
+        ``aborted``, why its decode was stopped early (its segments are then
+        marked ``low_confidence``).
+        """
+        model = self.model
+        if not hasattr(features, "window"):
+            features = PaddedMel(features)
+        dtype = torch.float16 if decode_options.get("fp16", True) else torch.float32
+        if model.device == torch.device("cpu"):
+            dtype = torch.float32
+        decode_options["fp16"] = dtype == torch.float16
+
+        if resume:
+            decode_options["language"] = resume["language"]
+        if decode_options.get("language") is None:
+            if not model.is_multilingual:
+                decode_options["language"] = "en"
+            else:
+                mel_segment, _ = features.window(0)
+                if mel_segment is None:
+                    return
+                mel_segment = self._to_model(mel_segment, dtype)
+                _, probs = model.detect_language(mel_segment)
+                decode_options["language"] = max(probs, key=probs.get)
+        language = decode_options["language"]
+        task = decode_options.get("task", "transcribe")
+        tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                  language=language, task=task)
+
+        input_stride = N_FRAMES // model.dims.n_audio_ctx
+        time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+
+        # The decoder only looks at this many prompt tokens
+        max_prompt = self.max_prompt_tokens
+        all_tokens = []
+        prompt_reset_since = 0
+        seek = 0
+        segment_id = 0
+        if resume:
+            all_tokens = list(resume["prompt"])
+            seek = resume["seek"]
+            segment_id = resume["next_segment_id"]
+        elif initial_prompt:
+            all_tokens.extend(tokenizer.encode(" " + initial_prompt.strip()))
+
+        def window_state(segments):
+            return {"seek": seek, "language": language, "segments": segments,
+                    "next_segment_id": segment_id, "prompt": all_tokens[prompt_reset_since:],
+                    "fallbacks": fallbacks, "aborted": aborted}
+
+        while True:
+            mel_segment, segment_size = features.window(seek)
+            if segment_size <= 0:
+                break
+            time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+            segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+            mel_segment = self._to_model(mel_segment, dtype)
+
+            decode_options["prompt"] = all_tokens[prompt_reset_since:]
+            result, fallbacks, aborted, keep = self._decode_with_fallback(mel_segment, decode_options)
+            tokens = torch.tensor(result.tokens[:keep])
+
+            if self.no_speech_threshold is not None:
+                should_skip = result.no_speech_prob > self.no_speech_threshold
+                if self.logprob_threshold is not None and result.avg_logprob > self.logprob_threshold:
+                    should_skip = False
+                if should_skip:
+                    seek += segment_size
+                    yield window_state([])
+                    continue
+
+            window_start = seek
+            spans = []
+            timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+            single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+            consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0] + 1
+
+            if len(consecutive) > 0:
+                slices = consecutive.tolist()
+                if single_timestamp_ending:
+                    slices.append(len(tokens))
+                last_slice = 0
+                for current_slice in slices:
+                    sliced_tokens = tokens[last_slice:current_slice]
+                    start_pos = sliced_tokens[0].item() - tokenizer.timestamp_begin
+                    end_pos = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                    spans.append((time_offset + start_pos * time_precision,
+                                  time_offset + end_pos * time_precision,
+                                  sliced_tokens.tolist()))
+                    last_slice = current_slice
+                if single_timestamp_ending or aborted:
+                    # An aborted window's unfinished last segment is not decoded again
+                    seek += segment_size
+                else:
+                    last_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+                    seek += last_pos * input_stride
+            else:
+                duration = segment_duration
+                timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+                if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+                    duration = (timestamps[-1].item() - tokenizer.timestamp_begin) * time_precision
+                spans.append((time_offset, time_offset + duration, tokens.tolist()))
+                seek += segment_size
+
+            segments = []
+            for start, end, span_tokens in spans:
+                text = tokenizer.decode([token for token in span_tokens if token < tokenizer.eot])
+                if start == end or not text.strip():
+                    text, span_tokens = "", []
+                segments.append({
+                    "id": segment_id,
+                    "seek": window_start,
+                    "start": start,
+                    "end": end,
+                    "text": text,
+                    "tokens": span_tokens,
+                    "temperature": result.temperature,
+                    "avg_logprob": result.avg_logprob,
+                    "compression_ratio": result.compression_ratio,
+                    "no_speech_prob": result.no_speech_prob,
+                    "low_confidence": aborted is not None,
+                })
+                segment_id += 1
+                all_tokens.extend(span_tokens)
+
+            if not self.condition_on_previous_text or result.temperature > 0.5 or aborted:
+                prompt_reset_since = len(all_tokens)
+            # Keep only the context the next windows can still use
+            if len(all_tokens) > max_prompt:
+                dropped = len(all_tokens) - max_prompt
+                all_tokens = all_tokens[dropped:]
+                prompt_reset_since = max(0, prompt_reset_since - dropped)
+
+            yield window_state(segments)
+
+    def _to_model(self, mel_segment, dtype):
+        """Move a numpy or torch mel window to the model's device and dtype"""
+        mel_segment = pad_or_trim(torch.as_tensor(mel_segment), N_FRAMES)
+        return mel_segment.to(self.model.device).to(dtype)
+
+    def _decode_with_fallback(self, mel_segment, decode_options):
+        """Decode a window, retrying at higher temperatures when the output looks degenerate.
+
+        Returns the result, how many retries it took, and if the decode was
+        stopped as a runaway, why and how many of its tokens to keep.  A
+        runaway is not retried: on noise or music the retries loop as well.
+        """
+        for fallbacks, temperature in enumerate(self.temperatures):
+            kwargs = dict(decode_options)
+            if temperature > 0:
+                kwargs.pop("beam_size", None)
+                kwargs.pop("patience", None)
+            else:
+                kwargs.pop("best_of", None)
+            options = DecodingOptions(**kwargs, temperature=temperature)
+            if not self.abort_runaway:
+                result = self.model.decode(mel_segment, options)
+                aborted = keep = None
+            else:
+                result, aborted, keep = self._decode_guarded(mel_segment, options)
+                if aborted:
+                    break
+
+            needs_fallback = False
+            if (self.compression_ratio_threshold is not None
+                    and result.compression_ratio > self.compression_ratio_threshold):
+                needs_fallback = True
+            if self.logprob_threshold is not None and result.avg_logprob < self.logprob_threshold:
+                needs_fallback = True
+            if self.no_speech_threshold is not None and result.no_speech_prob > self.no_speech_threshold:
+                needs_fallback = False
+            if not needs_fallback:
+                break
+        return result, fallbacks, aborted, keep
+
+    @torch.no_grad()
+    def _decode_guarded(self, mel_segment, options):
+        """model.decode with a RunawayGuard as the last logit filter"""
+        task = DecodingTask(self.model, options)
+        guard = RunawayGuard(task.tokenizer, task.sample_begin, beam_search=options.beam_size is not None,
+                             compression_ratio_threshold=self.compression_ratio_threshold)
+        task.logit_filters.append(guard)
+        result = task.run(mel_segment.unsqueeze(0))[0]
+        aborted = guard.aborted()
+        keep = None
+        if aborted:
+            # Which row the result came from is not known; trim only if they agree
+            kept = set(guard.keep)
+            if len(kept) == 1:
+                keep = kept.pop()
+        return result, aborted, keep
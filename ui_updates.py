@@ -0,0 +1,65 @@
+import queue
+
+
+class UIUpdates:
+    """Thread-safe, batched channel for updating Tk widgets from worker threads.
+
+    Workers only put events on a queue.  A single periodic ``root.after``
+    pump on the Tk thread drains it every ``interval_ms``: consecutive text
+    appends become one insert and only the latest status is shown, so the
+    cost per frame stays the same however fast results arrive.  Calls made
+    with ``call`` run in order with the text around them.
+    """
+
+    def __init__(self, root, events, status_label, append_text, interval_ms=50):
+        self.root = root
+        self.events = events
+        self.status_label = status_label
+        self.append_text = append_text
+        self.interval_ms = interval_ms
+
+    def start(self):
+        self.root.after(self.interval_ms, self._pump)
+
+    def status(self, text, foreground):
+        """Show a status message (superseded by any later one in the same frame)"""
+        self.events.put(("status", text, foreground))
+
+    def text(self, text):
+        """Append text to the transcription"""
+        self.events.put(("text", text))
+
+    def call(self, func, *args):
+        """Run func(*args) on the Tk thread"""
+        self.events.put(("call", func, args))
+
+    def _pump(self):
+        pending_text = []
+        pending_status = None
+        try:
+            while True:
+                try:
+                    event = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                if event[0] == "status":
+                    pending_status = event[1:]
+                elif event[0] == "text":
+                    pending_text.append(event[1])
+                else:
+                    # Keep ordering: what was posted before the call is shown first
+                    self._flush(pending_text, pending_status)
+                    pending_text, pending_status = [], None
+                    event[1](*event[2])
+            self._flush(pending_text, pending_status)
+        except Exception as e:
+            print(f"UI update error: {e}")
+        finally:
+            self.root.after(self.interval_ms, self._pump)
+
+    def _flush(self, pending_text, pending_status):
+        if pending_text:
+            self.append_text("".join(pending_text))
+        if pending_status:
+            text, foreground = pending_status
+            self.status_label.config(text=text, foreground=foreground)
@@ -0,0 +1,159 @@
+import collections
+
+import numpy as np
+
+
+class UtteranceSegmenter:
+    """Energy-based endpointing that cuts a continuous stream into utterances at pauses.
+
+    ``feed`` returns a list of ``(event, data)`` tuples: ``("start", samples)``
+    when speech begins (the samples include a short pre-roll), ``("audio",
+    samples)`` while it continues and ``("end", info)`` once ``min_silence``
+    seconds of quiet follow it or it reaches ``max_utterance`` seconds.
+    """
+
+    def __init__(self, sample_rate=16000, min_silence=0.7, max_utterance=20.0,
+                 threshold_db=-45.0, margin_db=10.0, frame_length=0.03,
+                 start_frames=3, pre_roll=0.3):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_length)
+        self.min_silence_frames = max(1, int(round(min_silence / frame_length)))
+        self.max_utterance_frames = max(1, int(max_utterance / frame_length))
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.start_frames = start_frames
+
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pre_roll = collections.deque(maxlen=max(start_frames, int(pre_roll / frame_length)))
+        self._noise_db = threshold_db - margin_db
+        self._speech_run = 0
+        self._in_utterance = False
+        self._utterance_frames = 0
+        self._speech_frames = 0
+        self._silence_run = 0
+
+    def feed(self, samples):
+        """Process mono float32 samples and return the endpointing events"""
+        self._pending = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32).reshape(-1)))
+        count = len(self._pending) // self.frame_size
+        if not count:
+            return []
+        frames = self._pending[:count * self.frame_size].reshape(count, self.frame_size)
+        self._pending = self._pending[count * self.frame_size:]
+
+        levels = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+        events = []
+        audio = []
+        for frame, level in zip(frames, levels):
+            is_speech = level > max(self.threshold_db, self._noise_db + self.margin_db)
+            if not self._in_utterance:
+                if not is_speech:
+                    # Slowly track the background level between utterances
+                    self._noise_db = 0.95 * self._noise_db + 0.05 * level
+                self._pre_roll.append(frame)
+                self._speech_run = self._speech_run + 1 if is_speech else 0
+                if self._speech_run >= self.start_frames:
+                    self._start_utterance(events)
+                continue
+
+            audio.append(frame)
+            self._utterance_frames += 1
+            if is_speech:
+                self._speech_frames += 1
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+
+            if self._silence_run >= self.min_silence_frames:
+                self._end_utterance(events, audio, forced=False)
+                audio = []
+            elif self._utterance_frames >= self.max_utterance_frames:
+                # Too long without a pause: cut here and carry straight on
+                self._end_utterance(events, audio, forced=True)
+                audio = []
+                self._pre_roll.clear()
+                self._start_utterance(events)
+
+        if audio:
+            events.append(("audio", np.concatenate(audio)))
+        return events
+
+    def flush(self):
+        """End the current utterance, if any, e.g. when capture stops"""
+        events = []
+        if self._in_utterance:
+            audio = [self._pending] if len(self._pending) else []
+            self._end_utterance(events, audio, forced=True)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pre_roll.clear()
+        self._speech_run = 0
+        return events
+
+    def _start_utterance(self, events):
+        """Open an utterance with the buffered pre-roll"""
+        pre_roll = list(self._pre_roll)
+        self._pre_roll.clear()
+        self._in_utterance = True
+        self._utterance_frames = len(pre_roll)
+        self._speech_frames = min(self._speech_run, len(pre_roll))
+        self._silence_run = 0
+        self._speech_run = 0
+        events.append(("start", np.concatenate(pre_roll) if pre_roll
+                       else np.zeros(0, dtype=np.float32)))
+
+    def _end_utterance(self, events, audio, forced):
+        """Close the current utterance"""
+        if audio:
+            events.append(("audio", np.concatenate(audio)))
+        events.append(("end", {
+            "duration": self._utterance_frames * self.frame_size / self.sample_rate,
+            "speech_seconds": self._speech_frames * self.frame_size / self.sample_rate,
+            "forced": forced,
+        }))
+        self._in_utterance = False
+        self._utterance_frames = 0
+        self._speech_frames = 0
+        self._silence_run = 0
+
+
+class ContinuousDictation:
+    """Turns a live capture stream into one transcription job per utterance.
+
+    Mel features for each utterance are computed while it is being spoken, so
+    a job handed to ``on_utterance`` only needs decoding.
+    """
+
+    def __init__(self, engine, on_utterance, sample_rate=16000, min_silence=0.7,
+                 max_utterance=20.0, min_speech=0.25):
+        self.engine = engine
+        self.on_utterance = on_utterance
+        self.min_speech = min_speech
+        self.segmenter = UtteranceSegmenter(sample_rate, min_silence=min_silence,
+                                            max_utterance=max_utterance)
+        self.utterances = 0
+        self._builder = None
+        self._peak = 0.0
+
+    def feed(self, samples):
+        """Feed captured mono float32 samples"""
+        self._handle(self.segmenter.feed(samples))
+
+    def flush(self):
+        """Finish the utterance in progress when capture stops"""
+        self._handle(self.segmenter.flush())
+
+    def _handle(self, events):
+        for event, data in events:
+            if event == "start":
+                self._builder = self.engine.new_feature_builder()
+                self._peak = 0.0
+            if event in ("start", "audio") and len(data):
+                self._builder.feed(data)
+                self._peak = max(self._peak, float(np.max(np.abs(data))))
+            elif event == "end":
+                builder, self._builder = self._builder, None
+                if data["speech_seconds"] < self.min_speech:
+                    builder.result()  # stop its worker thread
+                    continue
+                self.utterances += 1
+                self.on_utterance(dict(data, mel_builder=builder, peak=self._peak))
@@ -0,0 +1,224 @@
+"""Watch-folder transcription service.
+
+    python watch_folder.py watch /shared/recordings --workers 2 --model base
+    python watch_folder.py status
+
+New or changed audio files in the folder become jobs in the SQLite queue
+(job_queue.py); worker threads transcribe them to ``<output>/<name>.txt``.
+Finished jobs are never redone, and jobs interrupted by a crash are picked
+up again on the next start from their last checkpointed window.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from job_queue import JobQueue, default_db_path
+from metrics_log import log_metrics
+from metrics_export import REGISTRY as exported_metrics
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".opus", ".mp3", ".aiff", ".aif")
+
+
+class FolderWatcher:
+    """Polls a folder and enqueues each audio file once its size and mtime stop changing"""
+
+    def __init__(self, folder, output_dir, db_path=None, interval=5.0):
+        self.folder = os.path.abspath(folder)
+        self.output_dir = os.path.abspath(output_dir)
+        self.db_path = db_path
+        self.interval = interval
+        self._last_seen = {}
+
+    def scan(self, queue):
+        """Scan once; returns the number of jobs added"""
+        seen = {}
+        added = 0
+        for dirpath, _, filenames in os.walk(self.folder):
+            dirpath = os.path.abspath(dirpath)
+            if dirpath == self.output_dir or dirpath.startswith(self.output_dir + os.sep):
+                continue
+            for filename in filenames:
+                if not filename.lower().endswith(AUDIO_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                seen[path] = (st.st_size, st.st_mtime_ns)
+                # A file still being copied in changes between scans
+                if self._last_seen.get(path) != seen[path]:
+                    continue
+                relative = os.path.relpath(path, self.folder)
+                output = os.path.join(self.output_dir, os.path.splitext(relative)[0] + ".txt")
+                if queue.enqueue(path, st.st_size, st.st_mtime_ns, output):
+                    added += 1
+        self._last_seen = seen
+        return added
+
+    def run(self, stop_event):
+        queue = JobQueue(self.db_path)
+        try:
+            while not stop_event.is_set():
+                # Take over the jobs of stopped processes
+                requeued = queue.recover()
+                if requeued:
+                    print(f"Requeued {requeued} job(s) of a stopped process")
+                added = self.scan(queue)
+                if added:
+                    print(f"Queued {added} new file(s)")
+                stop_event.wait(self.interval)
+        finally:
+            queue.close()
+
+
+def renew_leases(stop_event, db_path=None):
+    """Renew the lease on this process's running jobs a few times per lease period.
+
+    Runs on its own thread, so neither a long transcription nor a slow scan
+    lets a lease expire while its job is still running.
+    """
+    queue = JobQueue(db_path)
+    try:
+        while not stop_event.wait(queue.lease / 3):
+            queue.heartbeat()
+    finally:
+        queue.close()
+
+
+class TranscriptionWorker(threading.Thread):
+    """Claims jobs from the queue and transcribes them with its own model instance.
+
+    Models are memory-mapped from the model store, so extra workers share
+    the weights' pages instead of each holding a copy.
+    """
+
+    def __init__(self, index, model_name, stop_event, db_path=None, idle_wait=2.0):
+        super().__init__(name=f"worker-{index}", daemon=True)
+        self.model_name = model_name
+        self.stop_event = stop_event
+        self.db_path = db_path
+        self.idle_wait = idle_wait
+        self.error = None
+
+    def run(self):
+        import model_store
+        from transcribe_file import transcribe_to_file
+        from transcription_engine import TranscriptionEngine
+
+        try:
+            # watch() has prefetched the model, so workers never race to download it
+            engine = TranscriptionEngine(model_store.load_model(self.model_name, allow_download=False),
+                                         self.model_name)
+        except Exception as e:
+            self.error = e
+            print(f"[{self.name}] could not load model '{self.model_name}': {e}")
+            # No job can be done without it, so stop the service rather than keep queuing
+            self.stop_event.set()
+            return
+        queue = JobQueue(self.db_path)
+        worker_name = f"{queue.worker_name}/{self.name}"
+        try:
+            while not self.stop_event.is_set():
+                job = queue.claim(worker_name)
+                exported_metrics.set("queue_depth", queue.stats()["queued"], queue="jobs")
+                if job is None:
+                    self.stop_event.wait(self.idle_wait)
+                    continue
+                queue_wait = time.time() - job["enqueued_at"]
+                print(f"[{self.name}] {job['path']}")
+                start_time = time.perf_counter()
+                try:
+                    os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+                    partial = job["output"] + ".part"
+                    record = transcribe_to_file(engine, job["path"], partial, show_progress=False)
+                    os.replace(partial, job["output"])
+                except Exception as e:
+                    queue.fail(job["id"], e)
+                    print(f"[{self.name}] failed: {job['path']}: {e}")
+                    continue
+                decode_seconds = time.perf_counter() - start_time
+                queue.finish(job["id"], record["audio_seconds"], decode_seconds)
+                log_metrics("job", model=self.model_name, audio_seconds=record["audio_seconds"],
+                            seconds=decode_seconds, queue_wait=queue_wait,
+                            peak_rss_mb=record.get("peak_rss_mb"), fallbacks=record.get("fallbacks"),
+                            aborts=record.get("aborts"))
+        finally:
+            queue.close()
+
+
+def watch(folder, output_dir=None, workers=1, model_name="base", db_path=None, interval=5.0):
+    """Run the watcher and workers until interrupted; returns an exit status"""
+    import model_store
+
+    output_dir = output_dir or os.path.join(folder, "transcripts")
+    try:
+        model_store.ensure_prefetched(model_name)
+    except Exception as e:
+        print(f"Could not load model '{model_name}': {e}")
+        return 1
+    queue = JobQueue(db_path)
+    requeued = queue.recover()
+    queue.close()
+    if requeued:
+        print(f"Resuming {requeued} interrupted job(s)")
+
+    stop_event = threading.Event()
+    threads = [TranscriptionWorker(i, model_name, stop_event, db_path) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    threading.Thread(target=renew_leases, args=(stop_event, db_path), name="leases", daemon=True).start()
+    watcher = FolderWatcher(folder, output_dir, db_path, interval)
+    try:
+        watcher.run(stop_event)
+    except KeyboardInterrupt:
+        print("Stopping; running jobs will be resumed on the next start")
+    finally:
+        stop_event.set()
+    if any(thread.error is not None for thread in threads):
+        print("Stopped: a worker could not load the model")
+        return 1
+    return 0
+
+
+def print_stats(db_path=None):
+    queue = JobQueue(db_path)
+    stats = queue.stats()
+    queue.close()
+    for key, value in stats.items():
+        if key == "oldest_queued_at" and value:
+            value = f"{time.time() - value:.0f}s ago"
+        elif isinstance(value, float):
+            value = f"{value:.2f}"
+        print(f"{key}: {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe audio files dropped into a folder")
+    parser.add_argument("--db", default=None, help=f"job database (default: {default_db_path()})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    watch_parser = sub.add_parser("watch", help="watch a folder and transcribe new files")
+    watch_parser.add_argument("folder")
+    watch_parser.add_argument("-o", "--output", help="transcript folder (default: <folder>/transcripts)")
+    watch_parser.add_argument("-w", "--workers", type=int, default=1)
+    watch_parser.add_argument("-m", "--model", default="base")
+    watch_parser.add_argument("--interval", type=float, default=5.0, help="seconds between scans")
+    sub.add_parser("status", help="show backlog and throughput")
+    sub.add_parser("retry", help="requeue failed jobs")
+    args = parser.parse_args(argv)
+
+    if args.command == "watch":
+        return watch(args.folder, args.output, args.workers, args.model, args.db, args.interval)
+    elif args.command == "retry":
+        queue = JobQueue(args.db)
+        print(f"Requeued {queue.retry_failed()} job(s)")
+        queue.close()
+    else:
+        print_stats(args.db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())